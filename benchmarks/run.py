@@ -0,0 +1,263 @@
+"""Benchmarks of parsing, names scanning, module resolution and edit generation.
+
+Each stage is timed several times on a fresh input and then run once more under `tracemalloc` to measure its peak
+memory. Results can be saved as a baseline and compared with later runs to catch regressions:
+
+```bash
+python benchmarks/run.py --save baseline.json
+python benchmarks/run.py --compare baseline.json
+```
+"""
+
+import argparse
+import ast
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from starkiller.parsing import parse_module
+from starkiller.project import StarkillerProject
+from starkiller.refactoring import rename, strip_base_name
+
+# Deep package tree shape: every package has this many subpackages and modules, down to the given depth
+_TREE_DEPTH = 6
+_TREE_WIDTH = 3
+# Nesting depth of functions and classes, kept well below the parser limit
+_NESTING_DEPTH = 40
+# Stdlib modules with long star import chains or large stubs
+_STDLIB_TARGETS = ("os", "asyncio", "typing", "email.mime.text", "sys")
+
+
+@dataclass(frozen=True)
+class _Stage:
+    name: str
+    setup: Callable[[], Any]
+    run: Callable[[Any], object]
+
+
+@dataclass(frozen=True)
+class _Result:
+    name: str
+    min_time: float
+    median_time: float
+    peak_memory: int
+
+
+def _make_large_module(size: int) -> str:
+    lines = ["import os", "import sys as system", "from collections import OrderedDict, defaultdict", ""]
+    for i in range(size):
+        lines.extend([
+            f"CONSTANT_{i} = os.path.join('a', str({i}))",
+            "",
+            f"def function_{i}(arg, *args, key=None, **kwargs):",
+            f"    local = [x * {i} for x in args if x]",
+            "    mapping = defaultdict(list)",
+            "    for item in local:",
+            "        mapping[item].append(system.maxsize)",
+            f"    return OrderedDict(mapping), CONSTANT_{i}, os.sep",
+            "",
+            f"class Class{i}:",
+            f"    attr = function_{i}(1, 2)",
+            "",
+            "    def method(self, value):",
+            "        with open(value) as fh:",
+            "            return os.fspath(fh.name), self.attr",
+            "",
+        ])
+    return "\n".join(lines)
+
+
+def _make_many_names_module(size: int) -> str:
+    # Every statement defines a new name and uses all kinds of known names
+    lines = ["import os", "from collections import OrderedDict", ""]
+    lines.extend(f"name_{i} = OrderedDict(os.sep, name_{i // 2}, len, undefined_{i % 10})" for i in range(size * 10))
+    return "\n".join(lines)
+
+
+def _make_nested_module(size: int) -> str:
+    # Functions and classes nested as deep as the parser allows, each level using names of all enclosing ones
+    lines = ["import os", ""]
+    for i in range(size // 10):
+        for level in range(_NESTING_DEPTH):
+            indent = "    " * level
+            keyword = "class" if level % 2 else "def"
+            args = "" if level % 2 else f"(arg_{level})"
+            lines.extend([
+                f"{indent}{keyword} scope_{i}_{level}{args}:",
+                f"{indent}    local_{level} = os.path.join(arg_{level - level % 2}, local_{max(level - 1, 0)})",
+            ])
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _make_package_tree(root: Path, depth: int, width: int) -> str:
+    """Create nested packages re-exporting their modules with star imports and return the deepest module name."""
+    package = root
+    name_parts: list[str] = []
+    for level in range(depth):
+        package /= f"pkg{level}"
+        package.mkdir()
+        name_parts.append(f"pkg{level}")
+        init_lines = [f"from .mod{i} import *" for i in range(width)]
+        if level < depth - 1:
+            init_lines.append(f"from .pkg{level + 1} import *")
+        (package / "__init__.py").write_text("\n".join(init_lines) + "\n")
+        for i in range(width):
+            (package / f"mod{i}.py").write_text(f"def func_{level}_{i}():\n    pass\n\nVALUE_{level}_{i} = 1\n")
+        for i in range(1, width):
+            (package / f"side{i}").mkdir()
+            (package / f"side{i}" / "__init__.py").touch()
+    return ".".join(name_parts)
+
+
+def _fresh_project(path: Path) -> StarkillerProject:
+    return StarkillerProject(path, cache_size=256)
+
+
+def _find_stdlib_modules(project: StarkillerProject) -> None:
+    for module_name in _STDLIB_TARGETS:
+        project.find_module(module_name)
+
+
+def _find_stdlib_definitions(project: StarkillerProject) -> None:
+    for module_name in _STDLIB_TARGETS:
+        project.find_definitions(module_name, {"path", "run", "Any", "MIMEText", "argv", "missing"})
+
+
+def _get_stages(workdir: Path, module_size: int) -> list[_Stage]:
+    source = _make_large_module(module_size)
+    many_names_source = _make_many_names_module(module_size)
+    nested_source = _make_nested_module(module_size)
+    tree_root = workdir / "tree"
+    tree_root.mkdir()
+    deepest = _make_package_tree(tree_root, _TREE_DEPTH, _TREE_WIDTH)
+    wanted = {f"func_{level}_{i}" for level in range(_TREE_DEPTH) for i in range(_TREE_WIDTH)} | {"missing"}
+
+    warm_project = _fresh_project(tree_root)
+    _find_stdlib_definitions(warm_project)
+    warm_project.find_definitions("pkg0", set(wanted))
+
+    return [
+        _Stage("parse_module", lambda: source, parse_module),
+        _Stage("parse_module targeted", lambda: source, lambda src: parse_module(src, {"function_1", "Class2"})),
+        _Stage(
+            "parse_module internal scopes",
+            lambda: source,
+            lambda src: parse_module(src, check_internal_scopes=True, collect_imported_attrs=True),
+        ),
+        _Stage("parse_module many names", lambda: many_names_source, parse_module),
+        _Stage(
+            "scan names internal scopes",
+            lambda: ast.parse(source),
+            lambda tree: parse_module(tree, check_internal_scopes=True, collect_imported_attrs=True),
+        ),
+        _Stage(
+            "parse_module nested scopes",
+            lambda: nested_source,
+            lambda src: parse_module(src, check_internal_scopes=True, collect_imported_attrs=True),
+        ),
+        _Stage("find_module stdlib cold", lambda: _fresh_project(tree_root), _find_stdlib_modules),
+        _Stage("find_module deep tree cold", lambda: _fresh_project(tree_root), lambda p: p.find_module(deepest)),
+        _Stage("find_definitions stdlib cold", lambda: _fresh_project(tree_root), _find_stdlib_definitions),
+        _Stage("find_definitions stdlib warm", lambda: warm_project, _find_stdlib_definitions),
+        _Stage(
+            "find_definitions deep tree cold",
+            lambda: _fresh_project(tree_root),
+            lambda p: p.find_definitions("pkg0", set(wanted)),
+        ),
+        _Stage(
+            "find_definitions deep tree warm",
+            lambda: warm_project,
+            lambda p: p.find_definitions("pkg0", set(wanted)),
+        ),
+        _Stage("rename", lambda: source, lambda src: list(rename(src, {"system": "sys", "OrderedDict": "ODict"}))),
+        _Stage("strip_base_name", lambda: source, lambda src: list(strip_base_name(src, "os", {"path", "sep"}))),
+    ]
+
+
+def _measure(stage: _Stage, repeat: int) -> _Result:
+    times = []
+    for _ in range(repeat):
+        arg = stage.setup()
+        start = time.perf_counter()
+        stage.run(arg)
+        times.append(time.perf_counter() - start)
+
+    arg = stage.setup()
+    tracemalloc.start()
+    try:
+        stage.run(arg)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return _Result(stage.name, min(times), statistics.median(times), peak_memory)
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run Starkiller benchmarks.")
+    parser.add_argument("-k", "--filter", default="", help="only run stages containing this substring")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per stage")
+    parser.add_argument("--module-size", type=int, default=500, help="number of function/class pairs in the module")
+    parser.add_argument("--save", type=Path, help="save results to a JSON file")
+    parser.add_argument("--compare", type=Path, help="compare results with a JSON file saved earlier")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    return parser.parse_args(argv)
+
+
+def _compare(results: list[_Result], baseline_path: Path, threshold: float) -> list[str]:
+    baseline = {item["name"]: item for item in json.loads(baseline_path.read_text(encoding="utf-8"))}
+    regressions = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+        time_ratio = result.min_time / base["min_time"] if base["min_time"] else 1.0
+        memory_ratio = result.peak_memory / base["peak_memory"] if base["peak_memory"] else 1.0
+        if time_ratio > threshold or memory_ratio > threshold:
+            regressions.append(f"{result.name}: time x{time_ratio:.2f}, peak memory x{memory_ratio:.2f}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run benchmarks and print a report.
+
+    Args:
+        argv: Command line arguments, defaults to `sys.argv`.
+
+    Returns:
+        Exit code, non-zero if a regression was found.
+    """
+    args = _parse_args(argv)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for stage in _get_stages(Path(workdir), args.module_size):
+            if args.filter not in stage.name:
+                continue
+            result = _measure(stage, args.repeat)
+            results.append(result)
+            sys.stdout.write(
+                f"{result.name:<36} min {result.min_time * 1000:9.2f} ms  median {result.median_time * 1000:9.2f} ms"
+                f"  peak {result.peak_memory / 1024:10.1f} KiB\n"
+            )
+
+    if args.save is not None:
+        args.save.write_text(json.dumps([asdict(result) for result in results], indent=2), encoding="utf-8")
+
+    if args.compare is not None:
+        regressions = _compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            sys.stderr.write(f"Regression in {regression}\n")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
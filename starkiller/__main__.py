@@ -0,0 +1,7 @@
+"""Allows to run Starkiller with `python -m starkiller`."""
+
+import sys
+
+from starkiller.cli import main
+
+sys.exit(main())
@@ -0,0 +1,285 @@
+"""Caches of parsed modules."""
+
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from starkiller.models import ImportedName, ModuleNames
+from starkiller.parsing import parse_module
+from starkiller.stats import count, timer
+
+log = logging.getLogger(__name__)
+
+# Bump on any change of the stored data format
+STORE_SCHEMA_VERSION = 3
+DEFAULT_STORE_NAME = "modules.sqlite3"
+
+
+@dataclass(frozen=True)
+class FileStamp:
+    """File modification stamp."""
+
+    mtime_ns: int
+    size: int
+
+
+def get_file_stamp(path: Path) -> FileStamp:
+    """Get current modification stamp of a file.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        FileStamp object.
+    """
+    stat = path.stat()
+    return FileStamp(stat.st_mtime_ns, stat.st_size)
+
+
+def _dump_names(names: ModuleNames) -> str:
+    data = {
+        "undefined": sorted(names.undefined),
+        "defined": sorted(names.defined),
+        "import_map": {
+            module: [[iname.name, iname.alias] for iname in inames] for module, inames in names.import_map.items()
+        },
+        "attr_usages": {name: sorted(attrs) for name, attrs in names.attr_usages.items()},
+        "all_names": None if names.all_names is None else sorted(names.all_names),
+    }
+    return json.dumps(data, separators=(",", ":"))
+
+
+def _load_names(dump: str) -> ModuleNames:
+    data: dict[str, Any] = json.loads(dump)
+    return ModuleNames(
+        undefined=set(data["undefined"]),
+        defined=set(data["defined"]),
+        import_map={
+            module: set(itertools.starmap(ImportedName, inames)) for module, inames in data["import_map"].items()
+        },
+        attr_usages={name: set(attrs) for name, attrs in data["attr_usages"].items()},
+        all_names=None if data["all_names"] is None else set(data["all_names"]),
+    )
+
+
+class ModuleNamesStore:
+    """On-disk store of parsed module files.
+
+    Keeps module names in an SQLite database, so they survive restarts and can be shared by several processes.
+    Entries are valid as long as the file modification time and size stay the same, entries of deleted files are pruned
+    when the database is opened. Storage errors and corrupt entries are logged and otherwise ignored: the store is an
+    optimisation only.
+    """
+
+    def __init__(self, db_path: Path | str) -> None:
+        """Inits store, creating the database if needed.
+
+        Args:
+            db_path: Path to the database file.
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def load(self, path: Path, stamp: FileStamp) -> ModuleNames | None:
+        """Get stored names of a module file.
+
+        Args:
+            path: Path to the module file.
+            stamp: Current modification stamp of the file.
+
+        Returns:
+            ModuleNames object or None if nothing valid is stored.
+        """
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT names FROM modules WHERE path = ? AND mtime_ns = ? AND size = ?",
+                    (str(path), stamp.mtime_ns, stamp.size),
+                ).fetchone()
+        except sqlite3.Error as err:
+            log.warning("Can't read module names from %s: %s", self.db_path, err)
+            return None
+        if row is None:
+            return None
+
+        try:
+            return _load_names(row[0])
+        except (ValueError, KeyError, TypeError) as err:
+            # E.g. truncated by a crash, parse the module again
+            log.warning("Dropping corrupt names of %s from %s: %s", path, self.db_path, err)
+            self.delete(path)
+            return None
+
+    def save(self, path: Path, stamp: FileStamp, names: ModuleNames) -> None:
+        """Store names of a module file.
+
+        Args:
+            path: Path to the module file.
+            stamp: Modification stamp of the parsed file.
+            names: Parsed module names.
+        """
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO modules (path, mtime_ns, size, names) VALUES (?, ?, ?, ?)",
+                        (str(path), stamp.mtime_ns, stamp.size, _dump_names(names)),
+                    )
+        except sqlite3.Error as err:
+            log.warning("Can't save module names to %s: %s", self.db_path, err)
+
+    def delete(self, path: Path) -> None:
+        """Drop stored names of a module file if any.
+
+        Args:
+            path: Path to the module file.
+        """
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute("DELETE FROM modules WHERE path = ?", (str(path),))
+        except sqlite3.Error as err:
+            log.warning("Can't delete module names from %s: %s", self.db_path, err)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        (schema_version,) = connection.execute("PRAGMA user_version").fetchone()
+        if schema_version != STORE_SCHEMA_VERSION:
+            with connection:
+                connection.execute("DROP TABLE IF EXISTS modules")
+                connection.execute(f"PRAGMA user_version = {STORE_SCHEMA_VERSION}")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS modules "
+                "(path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, names TEXT NOT NULL)"
+            )
+            # Entries of changed files are replaced on the next parse, but deleted files are never parsed again
+            deleted = [(path,) for (path,) in connection.execute("SELECT path FROM modules") if not Path(path).exists()]
+            connection.executemany("DELETE FROM modules WHERE path = ?", deleted)
+        self._connection = connection
+        return connection
+
+
+class ModuleNamesCache:
+    """LRU cache of parsed module files.
+
+    Entries are keyed by file path and are valid as long as the file modification time and size stay the same. The
+    cache can be used from several threads: a module requested while another thread is parsing it is parsed once.
+    """
+
+    def __init__(self, maxsize: int = 256, store: ModuleNamesStore | None = None) -> None:
+        """Inits cache.
+
+        Args:
+            maxsize: Maximum number of cached modules. Zero disables caching.
+            store: Optional on-disk store to consult before parsing a module.
+        """
+        self.maxsize = maxsize
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Path, tuple[FileStamp, ModuleNames]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight: dict[Path, Future[ModuleNames]] = {}
+
+    def parse(self, path: Path, parser: Callable[[str], ModuleNames] = parse_module) -> ModuleNames:
+        """Get names of a module file, parsing it if it is not cached or was changed.
+
+        Returned object is shared between callers and must not be modified.
+
+        Args:
+            path: Path to the module file.
+            parser: Function to parse module source with, e.g. in another process.
+
+        Returns:
+            ModuleNames object.
+        """
+        stamp = get_file_stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self.hits += 1
+                count("cache_hits")
+                self._entries.move_to_end(path)
+                return entry[1]
+
+            in_flight = self._in_flight.get(path)
+            if in_flight is None:
+                self.misses += 1
+                future: Future[ModuleNames] = Future()
+                self._in_flight[path] = future
+
+        if in_flight is not None:
+            # Another thread is parsing the module right now
+            count("in_flight_waits")
+            return in_flight.result()
+
+        try:
+            names = self._load(path, stamp, parser)
+        except BaseException as err:
+            with self._lock:
+                del self._in_flight[path]
+            future.set_exception(err)
+            raise
+
+        with self._lock:
+            del self._in_flight[path]
+            if self.maxsize > 0:
+                self._entries[path] = (stamp, names)
+                self._entries.move_to_end(path)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        future.set_result(names)
+        return names
+
+    def evict(self, path: Path) -> None:
+        """Drop cached module file if any, from the on-disk store as well.
+
+        Args:
+            path: Path to the module file.
+        """
+        with self._lock:
+            self._entries.pop(path, None)
+        if self.store is not None:
+            self.store.delete(path)
+
+    def clear(self) -> None:
+        """Drop all cached modules."""
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self, path: Path, stamp: FileStamp, parser: Callable[[str], ModuleNames]) -> ModuleNames:
+        names = self.store.load(path, stamp) if self.store is not None else None
+        if names is not None:
+            count("store_hits")
+            return names
+
+        count("modules_parsed")
+        with timer("parse_module"):
+            names = parser(path.read_text(encoding="utf-8"))
+        if self.store is not None:
+            self.store.save(path, stamp, names)
+        return names
@@ -0,0 +1,107 @@
+"""Command line interface to replace star imports in a whole project."""
+
+import argparse
+import difflib
+import sys
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+
+from starkiller.cache import DEFAULT_STORE_NAME
+from starkiller.project import StarkillerProject
+from starkiller.refactoring import apply_edits, replace_star_imports
+from starkiller.utils import default_cache_dir, iter_python_files
+
+
+@dataclass(frozen=True)
+class _ProjectSettings:
+    path: Path
+    env_path: Path | None
+    persistent_cache: Path | None
+
+
+@dataclass(frozen=True)
+class _FileResult:
+    path: Path
+    source: str = ""
+    new_source: str = ""
+    error: str | None = None
+
+
+@cache
+def _get_project(settings: _ProjectSettings) -> StarkillerProject:
+    # One project per process, so every worker resolves modules once and shares parsed modules via the on-disk cache
+    return StarkillerProject(settings.path, env_path=settings.env_path, persistent_cache=settings.persistent_cache)
+
+
+def _process_file(settings: _ProjectSettings, path: Path) -> _FileResult:
+    try:
+        source = path.read_text(encoding="utf-8")
+        edits = list(replace_star_imports(source, _get_project(settings), path))
+    except (OSError, UnicodeDecodeError, SyntaxError) as err:
+        return _FileResult(path, error=str(err))
+    return _FileResult(path, source, apply_edits(source, edits) if edits else source)
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="starkiller", description="Replace star imports with explicit names.")
+    parser.add_argument("paths", nargs="*", type=Path, default=[Path()], help="files or directories to process")
+    parser.add_argument("--project", type=Path, default=Path(), help="project root, defaults to current directory")
+    parser.add_argument("--env", type=Path, help="virtual environment path, defaults to <project>/.venv if exists")
+    parser.add_argument("--write", action="store_true", help="write changes instead of printing diffs")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="don't use the on-disk cache of parsed modules")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the command line interface.
+
+    Args:
+        argv: Command line arguments, defaults to `sys.argv`.
+
+    Returns:
+        Exit code.
+    """
+    args = _parse_args(argv)
+
+    project_path = args.project.resolve()
+    env_path = args.env
+    if env_path is None and (project_path / ".venv").exists():
+        env_path = project_path / ".venv"
+    persistent_cache = None if args.no_cache else default_cache_dir() / DEFAULT_STORE_NAME
+    settings = _ProjectSettings(project_path, env_path, persistent_cache)
+
+    # Star imports of package init modules usually re-export names rather than use them
+    files = [path for path in iter_python_files(args.paths) if path.name != "__init__.py"]
+    if args.jobs == 1 or len(files) <= 1:
+        results: Iterable[_FileResult] = (_process_file(settings, path) for path in files)
+        return _report(results, write=args.write)
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = executor.map(_process_file, [settings] * len(files), files, chunksize=4)
+        return _report(results, write=args.write)
+
+
+def _report(results: Iterable[_FileResult], *, write: bool) -> int:
+    exit_code = 0
+    for result in results:
+        if result.error is not None:
+            sys.stderr.write(f"{result.path}: {result.error}\n")
+            exit_code = 1
+        elif result.new_source == result.source:
+            continue
+        elif write:
+            result.path.write_text(result.new_source, encoding="utf-8")
+            sys.stderr.write(f"Fixed {result.path}\n")
+        else:
+            diff = difflib.unified_diff(
+                result.source.splitlines(keepends=True),
+                result.new_source.splitlines(keepends=True),
+                fromfile=str(result.path),
+                tofile=str(result.path),
+            )
+            sys.stdout.writelines(diff)
+    return exit_code
@@ -0,0 +1,118 @@
+"""Graph of imports between project modules."""
+
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+from starkiller.models import ImportedName
+
+
+class ImportGraph:
+    """Imports between modules with reverse edges.
+
+    Nodes are full module names, edges go from an importing module to an imported one and carry imported names.
+    Relative imports are stored with absolute module names. Updating a module only touches its own edges, so the graph
+    can be kept up to date file by file. The graph is thread safe, getters return copies.
+    """
+
+    def __init__(self) -> None:
+        """Inits an empty graph."""
+        self._paths: dict[str, Path] = {}
+        self._imports: dict[str, dict[str, set[ImportedName]]] = {}
+        self._importers: dict[str, set[str]] = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, module_name: object) -> bool:
+        """Check whether a module was added to the graph."""
+        return module_name in self._imports
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over names of added modules."""
+        with self._lock:
+            return iter(list(self._imports))
+
+    def __len__(self) -> int:
+        """Get number of added modules."""
+        return len(self._imports)
+
+    def update(self, module_name: str, path: Path, imports: dict[str, set[ImportedName]]) -> None:
+        """Add a module or replace its imports.
+
+        Args:
+            module_name: Full name of the module.
+            path: Path to the module file.
+            imports: Imported names by absolute names of imported modules.
+        """
+        with self._lock:
+            self.remove(module_name)
+            self._paths[module_name] = path
+            self._imports[module_name] = {imodule: set(inames) for imodule, inames in imports.items()}
+            for imodule in imports:
+                self._importers.setdefault(imodule, set()).add(module_name)
+
+    def remove(self, module_name: str) -> None:
+        """Remove a module and its imports, imports of the module by other modules are kept.
+
+        Args:
+            module_name: Full name of the module.
+        """
+        with self._lock:
+            self._paths.pop(module_name, None)
+            for imodule in self._imports.pop(module_name, {}):
+                importers = self._importers[imodule]
+                importers.discard(module_name)
+                if not importers:
+                    del self._importers[imodule]
+
+    def get_path(self, module_name: str) -> Path | None:
+        """Get path to a module file.
+
+        Args:
+            module_name: Full name of the module.
+
+        Returns:
+            Path or None if the module wasn't added.
+        """
+        return self._paths.get(module_name)
+
+    def get_imports(self, module_name: str) -> dict[str, set[ImportedName]]:
+        """Get modules imported by a module.
+
+        Args:
+            module_name: Full name of the importing module.
+
+        Returns:
+            Imported names by imported module names.
+        """
+        with self._lock:
+            return {imodule: set(inames) for imodule, inames in self._imports.get(module_name, {}).items()}
+
+    def get_importers(self, module_name: str) -> dict[str, set[ImportedName]]:
+        """Get modules importing a module.
+
+        Args:
+            module_name: Full name of the imported module.
+
+        Returns:
+            Imported names by importing module names.
+        """
+        with self._lock:
+            return {
+                importer: set(self._imports[importer][module_name]) for importer in self._importers.get(module_name, ())
+            }
+
+    def get_star_importers(self, module_name: str) -> set[str]:
+        """Get modules star importing a module.
+
+        Args:
+            module_name: Full name of the imported module.
+
+        Returns:
+            Set of importing module names.
+        """
+        with self._lock:
+            return {
+                importer
+                for importer in self._importers.get(module_name, ())
+                if any(iname.name == "*" for iname in self._imports[importer][module_name])
+            }
@@ -1,7 +1,7 @@
 """Data structures."""
 
 from ast import stmt
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 
@@ -21,6 +21,8 @@ class ModuleNames:
     defined: set[str]
     import_map: dict[str, set[ImportedName]]
     attr_usages: dict[str, set[str]]
+    # Literal `__all__` value, None if not defined or can't be evaluated statically
+    all_names: set[str] | None = None
 
 
 @dataclass
@@ -57,6 +59,33 @@ class ImportModulesStatement:
     import_range: EditRange
 
 
+@dataclass(frozen=True)
+class ImportIssues:
+    """Import issues found in a source file."""
+
+    path: Path
+    # Star import statements in order of appearance and used names they provide, a module may be star imported twice
+    star_imports: list[tuple[ImportFromStatement, set[str]]] = field(default_factory=list)
+    unused_imports: dict[str, set[ImportedName]] = field(default_factory=dict)
+    error: str | None = None
+
+
+@dataclass(frozen=True)
+class DefinitionsReport:
+    """Definitions found in a module and the way they were resolved."""
+
+    module: str
+    found: set[str]
+    # Modules explored in order, each one once
+    modules: list[str] = field(default_factory=list)
+    # Followed star imports as (importing module, imported module) pairs
+    star_imports: list[tuple[str, str]] = field(default_factory=list)
+    # Star import cycles, each starting and ending with the same module
+    cycles: list[tuple[str, ...]] = field(default_factory=list)
+    # Modules that couldn't be found, e.g. extension modules without stubs or packages that aren't installed
+    unresolved: list[str] = field(default_factory=list)
+
+
 @dataclass
 class Module:
     """Universal module type."""
@@ -76,3 +105,10 @@ class _LocalScope:
     name: str
     body: list[stmt]
     args: list[str] | None = None
+
+
+@dataclass(frozen=True)
+class _ScopeSummary:
+    events: tuple[tuple[str, ...], ...]
+    scopes: tuple["_ScopeSummary", ...]
+    args: tuple[str, ...] = ()
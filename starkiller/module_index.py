@@ -0,0 +1,137 @@
+"""Index of importable modules in search path directories."""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from starkiller.models import Module
+from starkiller.stats import count
+
+MODULE_EXTENSIONS = (".py", ".pyi")
+# Seconds between checks of a listed directory for added or removed entries
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+@dataclass
+class _DirectoryListing:
+    files: dict[str, Path] = field(default_factory=dict)
+    dirs: dict[str, Path] = field(default_factory=dict)
+    mtime_ns: int | None = None
+    checked_at: float = 0.0
+
+
+def _get_mtime_ns(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _list_directory(path: Path) -> _DirectoryListing:
+    listing = _DirectoryListing(mtime_ns=_get_mtime_ns(path), checked_at=time.monotonic())
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        # Missing directories and zip archives from sys.path contain nothing to index
+        return listing
+
+    for entry in entries:
+        entry_path = path / entry.name
+        if entry.is_dir():
+            listing.dirs[entry.name] = entry_path
+        elif entry_path.suffix in MODULE_EXTENSIONS:
+            # Prefer sources over stubs, regardless of the listing order
+            known = listing.files.get(entry_path.stem)
+            if known is None or MODULE_EXTENSIONS.index(entry_path.suffix) < MODULE_EXTENSIONS.index(known.suffix):
+                listing.files[entry_path.stem] = entry_path
+    return listing
+
+
+class ModuleIndex:
+    """Module names index.
+
+    Each search path directory is listed once, on the first lookup that touches it. Package directories are listed
+    lazily as well, when their submodules are looked up, so resolving a module is a few dictionary lookups.
+
+    Adding or removing a directory entry updates the directory modification time. If polling is enabled, a listing
+    used after the poll interval has passed is checked against it and listed again if the directory was changed, so
+    packages installed or removed while the index is in use are picked up.
+
+    The index is thread safe. Directories are listed under a lock, so a listing never outlives an invalidation that
+    happened while it was being made.
+    """
+
+    def __init__(self, poll_interval: float | None = None) -> None:
+        """Inits an empty index.
+
+        Args:
+            poll_interval: Seconds between checks of a directory listing for changes, None to never check.
+        """
+        self.poll_interval = poll_interval
+        self._listings: dict[Path, _DirectoryListing] = {}
+        self._lock = threading.Lock()
+
+    def find(self, module_name: str, paths: list[Path]) -> Module | None:
+        """Find a top level module in given search paths.
+
+        Module files are preferred over packages, as long as they are found in any of the search paths.
+
+        Args:
+            module_name: Short name of the module, e.g. `"api"`.
+            paths: Directories to search in, in order of priority.
+
+        Returns:
+            Module object or None.
+        """
+        with self._lock:
+            listings = [self._get_listing(path) for path in paths]
+
+        for listing in listings:
+            file = listing.files.get(module_name)
+            if file is not None:
+                return Module(name=module_name, fullname=module_name, path=file)
+
+        for listing in listings:
+            directory = listing.dirs.get(module_name)
+            if directory is not None:
+                return Module(
+                    name=module_name,
+                    fullname=module_name,
+                    path=directory / "__init__.py",
+                    submodule_paths=[directory],
+                )
+
+        return None
+
+    def clear(self) -> None:
+        """Forget all directory listings."""
+        with self._lock:
+            self._listings.clear()
+
+    def invalidate(self, path: Path) -> None:
+        """Forget listings affected by a created, deleted or changed file or directory.
+
+        Args:
+            path: Path to the changed file or directory.
+        """
+        with self._lock:
+            self._listings.pop(path, None)
+            self._listings.pop(path.parent, None)
+
+    def _get_listing(self, path: Path) -> _DirectoryListing:
+        # Must be called with the lock held
+        listing = self._listings.get(path)
+        if listing is not None and self.poll_interval is not None:
+            now = time.monotonic()
+            if now - listing.checked_at >= self.poll_interval:
+                listing.checked_at = now
+                if _get_mtime_ns(path) != listing.mtime_ns:
+                    count("stale_listings")
+                    listing = None
+
+        if listing is None:
+            listing = _list_directory(path)
+            self._listings[path] = listing
+        return listing
@@ -5,69 +5,236 @@ Scans the code scope for definitions and usages (including attribute usages).
 """
 
 import ast
-from collections.abc import Generator
-from contextlib import contextmanager
+import itertools
+from collections.abc import Callable, Generator, Iterator
+from typing import Any
 
-from starkiller.models import ImportedName, _LocalScope
-from starkiller.utils import BUILTIN_FUNCTIONS
+from starkiller.models import ImportedName, _LocalScope, _ScopeSummary
+from starkiller.utils import get_builtin_names
 
+# Kinds of recorded scanner events
+_DEFINITION = "definition"
+_USAGE = "usage"
+_IMPORT = "import"
+_ATTR_USAGE = "attr_usage"
+_ALL_NAMES = "all_names"
+_EXTEND_ALL_NAMES = "extend_all_names"
+_UNKNOWN_ALL_NAMES = "unknown_all_names"
 
-class _NamesScanner(ast.NodeVisitor):
-    def __init__(self, find_definitions: set[str] | None = None, *, collect_imported_attrs: bool = False) -> None:
-        super().__init__()
 
-        # Names that were used but never initialized in this module
-        self._undefined: set[str] = set()
+def _get_literal_names(node: ast.expr) -> tuple[str, ...] | None:
+    # Only lists and tuples of string literals (and their sums) can be evaluated without running the code
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left = _get_literal_names(node.left)
+        right = _get_literal_names(node.right)
+        return None if left is None or right is None else left + right
+    if not isinstance(node, ast.List | ast.Tuple):
+        return None
+    names = []
+    for element in node.elts:
+        if not isinstance(element, ast.Constant) or not isinstance(element.value, str):
+            return None
+        names.append(element.value)
+    return tuple(names)
+
+
+# Handler of a node type: records names and returns child nodes to visit, if any
+_Handler = Callable[[Any, Any], Iterator[object] | None]
+
+
+def _iter_node_types(node_type: type[ast.AST] = ast.AST) -> Generator[type[ast.AST]]:
+    for subtype in node_type.__subclasses__():
+        yield subtype
+        yield from _iter_node_types(subtype)
+
+
+# Markers yielded by handlers around children that are assignment targets, where names are definitions
+_ENTER_DEFINITION = object()
+_EXIT_DEFINITION = object()
+
+
+def _visit_children(_scanner: object, node: ast.AST) -> Iterator[ast.AST]:
+    return ast.iter_child_nodes(node)
+
+
+# Handlers by node type for each scanner type, built on first use
+_dispatch_tables: dict[type, dict[type, _Handler]] = {}
+
+
+def _get_dispatch_table(scanner_type: type) -> dict[type, _Handler]:
+    # Names are handled by the traversal itself. Other node types with no handler here, like contexts, operators and
+    # constants, contain no names.
+    table = _dispatch_tables.get(scanner_type)
+    if table is not None:
+        return table
+
+    table = {}
+    for node_type in _iter_node_types():
+        handler = getattr(scanner_type, f"visit_{node_type.__name__}", None)
+        if handler is not None:
+            table[node_type] = handler
+        elif node_type._fields and node_type not in {ast.Constant, ast.Name}:
+            table[node_type] = _visit_children
+    # Tables built concurrently are the same, either one may be kept
+    _dispatch_tables[scanner_type] = table
+    return table
+
+
+class _Scope:
+    # Link of the scope chain. Names visible in the innermost scope are kept in sets shared by the whole chain, so
+    # entering a scope copies nothing: the scope remembers names it added and removes them when left.
+    __slots__ = ("added_defined", "added_imported", "attr_usages", "internal_scopes", "parent", "undefined")
+
+    def __init__(self, parent: "_Scope | None" = None) -> None:
+        self.parent = parent
 
-        # Names initialized in this module
+        # Names used in this scope or its internal scopes but never initialized
+        self.undefined: set[str] = set()
+
+        # Names that became visible in this scope only
+        self.added_defined: list[str] = []
+        self.added_imported: list[str] = []
+
+        # Internal scopes must be checked after visiting the scope itself
+        self.internal_scopes: list[_LocalScope | _ScopeSummary] = []
+
+        self.attr_usages: dict[str, set[str]] = {}
+
+
+class _NamesScanner:
+    def __init__(self, find_definitions: set[str] | None = None, *, collect_imported_attrs: bool = False) -> None:
+        # Innermost scope of the chain, the module scope until internal scopes are visited
+        self._scope = _Scope()
+
+        # Names initialized in the scope chain
         self._defined: set[str] = set()
 
-        # Names imported from elsewhere
+        # Names imported from elsewhere, the map is only collected for the module scope
         self._import_map: dict[str, set[ImportedName]] = {}
         self._imported: set[str] = set()
+        self._builtin_names = get_builtin_names()
 
         # Stop iteration on finding all of these names
         self._find_definitions = None if find_definitions is None else dict.fromkeys(find_definitions, False)
-
-        # Internal scopes must be checked after visiting the top level
-        self._internal_scopes: list[_LocalScope] = []
-
-        # How to treat ast.Name: if True, this might be a definition
-        self._in_definition_context = False
+        self._left_to_find = len(self._find_definitions or ())
 
         # If True, will record attribute usages of ast.Name nodes
         self._collect_imported_attrs = collect_imported_attrs
-        self._attr_usages: dict[str, set[str]] = {}
+
+        # Module `__all__` value, if it is a literal
+        self._all_names: set[str] | None = None
+
+    @property
+    def found_all(self) -> bool:
+        # Whether all names we were looking for are already found
+        return self._left_to_find == 0 and bool(self._find_definitions)
 
     def visit(self, node: ast.AST) -> None:
-        if self._find_definitions and all(self._find_definitions.values()):
-            return
-        super().visit(node)
+        # Nodes are visited depth first with an explicit stack of child iterators, so deeply nested expressions don't
+        # hit the recursion limit. Handlers are generators if they need to act after visiting children. Whether names
+        # are definitions is kept on the stack as well, so the state of a traversal is never shared.
+        dispatch = _get_dispatch_table(type(self))
+        stack: list[Iterator[object]] = [iter((node,))]
+        in_definition = [False]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                in_definition.pop()
+                continue
+
+            # Handlers already started are still finished
+            if self._left_to_find == 0 and self.found_all:
+                continue
+
+            if isinstance(child, ast.Name):
+                if in_definition[-1]:
+                    self._record_definition(child.id)
+                else:
+                    self._record_undefined_name(child.id)
+                continue
+
+            handler = dispatch.get(type(child))
+            if handler is not None:
+                children = handler(self, child)
+                if children is not None:
+                    stack.append(children)
+                    in_definition.append(in_definition[-1])
+            elif child is _ENTER_DEFINITION:
+                in_definition[-1] = True
+            elif child is _EXIT_DEFINITION:
+                in_definition[-1] = False
 
     def visit_internal_scopes(self) -> None:
-        for scope in self._internal_scopes:
-            scope_visitor = _NamesScanner(find_definitions=None, collect_imported_attrs=self._collect_imported_attrs)
-
-            # Known names
-            scope_visitor._defined = self._defined.copy()
-            if scope.args:
-                scope_visitor._defined.update(scope.args)
-            scope_visitor._import_map = self._import_map.copy()
-            scope_visitor._imported = self._imported.copy()
+        # Definitions in internal scopes are not module definitions
+        find_definitions = self._find_definitions
+        self._find_definitions = None
+        try:
+            self._visit_internal_scopes()
+        finally:
+            self._find_definitions = find_definitions
+
+    def _visit_internal_scopes(self) -> None:
+        parent = self._scope
+        for scope in parent.internal_scopes:
+            self._scope = _Scope(parent)
+            for arg in scope.args or ():
+                self._add_defined(arg)
 
             # Visit scope body and all internal scopes
-            for scope_node in scope.body:
-                scope_visitor.visit(scope_node)
-            scope_visitor.visit_internal_scopes()
-
-            # Update upper scope undefined names set
-            self._undefined.update(scope_visitor.undefined)
-
-            # Update attribute usages set, excluding names defined in the internal scope
-            external_names_attr_usages = {
-                a: v for a, v in scope_visitor.attr_usages.items() if a not in scope_visitor._defined
-            }
-            self._attr_usages.update(external_names_attr_usages)
+            if isinstance(scope, _ScopeSummary):
+                self.replay(scope)
+            else:
+                for scope_node in scope.body:
+                    self.visit(scope_node)
+            self._visit_internal_scopes()
+            self._exit_scope(parent)
+
+    def _exit_scope(self, parent: _Scope) -> None:
+        scope = self._scope
+
+        # Update upper scope undefined names set
+        parent.undefined.update(scope.undefined)
+
+        # Update attribute usages set, excluding names defined in the internal scope
+        for name, attrs in scope.attr_usages.items():
+            if name not in self._defined:
+                parent.attr_usages[name] = attrs
+
+        # Forget names of the internal scope
+        self._defined.difference_update(scope.added_defined)
+        self._imported.difference_update(scope.added_imported)
+        self._scope = parent
+
+    def _add_defined(self, name: str) -> None:
+        if name not in self._defined:
+            self._defined.add(name)
+            self._scope.added_defined.append(name)
+
+    def _add_imported(self, name: str) -> None:
+        if name not in self._imported:
+            self._imported.add(name)
+            self._scope.added_imported.append(name)
+
+    def replay(self, summary: _ScopeSummary) -> None:
+        # Apply events recorded by _SummaryRecorder as if the summarized nodes were visited
+        for event in summary.events:
+            kind = event[0]
+            if kind == _DEFINITION:
+                self._record_definition(event[1])
+            elif kind == _USAGE:
+                self._record_undefined_name(event[1])
+            elif kind == _IMPORT:
+                self.record_import_from_module(event[1], event[2], event[3] or None)
+            elif kind == _ATTR_USAGE and self._collect_imported_attrs:
+                self._record_attr_usage(event[1], event[2])
+            elif kind == _ALL_NAMES:
+                self._record_all_names(event[1:])
+            elif kind == _EXTEND_ALL_NAMES:
+                self._extend_all_names(event[1:])
+            elif kind == _UNKNOWN_ALL_NAMES:
+                self._record_all_names(None)
+        self._scope.internal_scopes.extend(summary.scopes)
 
     @property
     def defined(self) -> set[str]:
@@ -79,7 +246,7 @@ class _NamesScanner(ast.NodeVisitor):
 
     @property
     def undefined(self) -> set[str]:
-        return self._undefined.copy()
+        return self._scope.undefined.copy()
 
     @property
     def import_map(self) -> dict[str, set[ImportedName]]:
@@ -87,45 +254,48 @@ class _NamesScanner(ast.NodeVisitor):
 
     @property
     def attr_usages(self) -> dict[str, set[str]]:
-        return self._attr_usages.copy()
+        return self._scope.attr_usages.copy()
 
-    @contextmanager
-    def definition_context(self) -> Generator[None]:
-        # This is not thread safe! Consider using thead local data to store definition context state.
-        # Context manager is used in this class to control new names treatment: either to record them as definitions or
-        # as possible usages of undefined names.
-        self._in_definition_context = True
-        yield
-        self._in_definition_context = False
+    @property
+    def all_names(self) -> set[str] | None:
+        return None if self._all_names is None else self._all_names.copy()
 
     def record_import_from_module(self, module_name: str, name: str, alias: str | None = None) -> None:
-        imported_name = ImportedName(name, alias)
-        self._import_map.setdefault(module_name, set())
-        self._import_map[module_name].add(imported_name)
-        self._imported.add(alias or name)
+        if self._scope.parent is None:
+            self._import_map.setdefault(module_name, set()).add(ImportedName(name, alias))
+        self._add_imported(alias or name)
 
     def _record_definition(self, name: str) -> None:
         # Make sure the name wasn't used with no initialization
-        if name not in (self._undefined | self._imported):
-            self._defined.add(name)
+        if name in self._scope.undefined or name in self._imported:
+            return
+        self._add_defined(name)
 
-            # If searching for definitions, cross out already found
-            if self._find_definitions is not None and name in self._find_definitions:
-                self._find_definitions[name] = True
+        # If searching for definitions, cross out already found
+        if self._find_definitions is not None and self._find_definitions.get(name) is False:
+            self._find_definitions[name] = True
+            self._left_to_find -= 1
 
     def _record_undefined_name(self, name: str) -> None:
         # Record only uninitialised uses
-        if name not in (self._defined | self._imported | BUILTIN_FUNCTIONS):
-            self._undefined.add(name)
+        if name not in self._defined and name not in self._imported and name not in self._builtin_names:
+            self._scope.undefined.add(name)
 
-    def record_name(self, name: str) -> None:
-        if self._in_definition_context:
-            self._record_definition(name)
-        else:
-            self._record_undefined_name(name)
+    def _record_attr_usage(self, name: str, attr: str) -> None:
+        self._scope.attr_usages.setdefault(name, set()).add(attr)
+
+    def _record_all_names(self, names: tuple[str, ...] | None) -> None:
+        # Only module level `__all__` is taken into account
+        if self._scope.parent is None:
+            self._all_names = None if names is None else set(names)
 
-    def visit_Name(self, node: ast.Name) -> None:
-        self.record_name(node.id)
+    def _extend_all_names(self, names: tuple[str, ...] | None) -> None:
+        if self._scope.parent is not None:
+            return
+        if names is None or self._all_names is None:
+            self._all_names = None
+        else:
+            self._all_names.update(names)
 
     def visit_Import(self, node: ast.Import) -> None:
         for name in node.names:
@@ -147,78 +317,138 @@ class _NamesScanner(ast.NodeVisitor):
                 alias=name.asname,
             )
 
-    def visit_Assign(self, node: ast.Assign) -> None:
-        with self.definition_context():
-            for target in node.targets:
-                self.visit(target)
-        self.visit(node.value)
+    def visit_Assign(self, node: ast.Assign) -> Iterator[object]:
+        yield _ENTER_DEFINITION
+        yield from node.targets
+        yield _EXIT_DEFINITION
+        yield node.value
+
+        if any(isinstance(target, ast.Name) and target.id == "__all__" for target in node.targets):
+            self._record_all_names(_get_literal_names(node.value))
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> Iterator[ast.AST]:
+        yield from ast.iter_child_nodes(node)
+        if isinstance(node.target, ast.Name) and node.target.id == "__all__":
+            is_extension = isinstance(node.op, ast.Add)
+            self._extend_all_names(_get_literal_names(node.value) if is_extension else None)
+
+    def visit_Call(self, node: ast.Call) -> Iterator[ast.AST]:
+        func = node.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "__all__":
+            self._visit_all_names_method(func.attr, node)
 
-    def visit_Call(self, node: ast.Call) -> None:
         # Called a function, not an attribute method
-        if isinstance(node.func, ast.Name | ast.Attribute):
-            self.visit(node.func)
+        if isinstance(func, ast.Name | ast.Attribute):
+            yield func
 
         # Values passed as arguments
-        for arg in node.args:
-            self.visit(arg)
+        yield from node.args
         for kwarg in node.keywords:
-            self.visit(kwarg.value)
+            yield kwarg.value
 
-    def visit_Attribute(self, node: ast.Attribute) -> None:
+    def visit_Attribute(self, node: ast.Attribute) -> Iterator[ast.AST] | None:
         owner = node.value
-        if isinstance(owner, ast.Attribute | ast.Call | ast.Name):
-            self.visit(owner)
-
         if isinstance(owner, ast.Name) and self._collect_imported_attrs:
-            self._attr_usages.setdefault(owner.id, set()).add(node.attr)
-
-    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+            self._record_attr_usage(owner.id, node.attr)
+        if isinstance(owner, ast.Attribute | ast.Call | ast.Name):
+            return iter((owner,))
+        return None
+
+    def _visit_all_names_method(self, method: str, node: ast.Call) -> None:
+        # Literal `__all__.extend([...])` and `__all__.append("...")`, any other modification makes it unknown
+        names: tuple[str, ...] | None = None
+        if len(node.args) == 1 and not node.keywords:
+            arg = node.args[0]
+            if method == "extend":
+                names = _get_literal_names(arg)
+            elif method == "append" and isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                names = (arg.value,)
+        self._extend_all_names(names)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> Iterator[ast.AST]:
         self._record_definition(node.name)
 
-        for decorator in node.decorator_list:
-            self.visit(decorator)
-        for base in node.bases:
-            self.visit(base)
+        yield from node.decorator_list
+        yield from node.bases
         for kwarg in node.keywords:
-            self.visit(kwarg.value)
+            yield kwarg.value
         # TODO: type_params
 
-        self._internal_scopes.append(
+        self._scope.internal_scopes.append(
             _LocalScope(
                 name=node.name,
-                body=node.body.copy(),
+                body=node.body,
                 args=[],
             ),
         )
 
-    def _visit_callable(self, node: ast.FunctionDef | ast.AsyncFunctionDef) -> None:
-        with self.definition_context():
-            self.record_name(node.name)
+    def _visit_callable(self, node: ast.FunctionDef | ast.AsyncFunctionDef) -> Iterator[ast.AST]:
+        self._record_definition(node.name)
 
-        args = node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+        args = [*node.args.posonlyargs, *node.args.args, *node.args.kwonlyargs]
 
         # Check for no inits
-        for decorator in node.decorator_list:
-            self.visit(decorator)
+        yield from node.decorator_list
         for arg in args:
             if arg.annotation:
-                self.visit(arg.annotation)
-        for default in node.args.defaults + node.args.kw_defaults:
+                yield arg.annotation
+        for default in itertools.chain(node.args.defaults, node.args.kw_defaults):
             if default is not None:
-                self.visit(default)
+                yield default
         if node.returns:
-            self.visit(node.returns)
+            yield node.returns
 
-        self._internal_scopes.append(
+        self._scope.internal_scopes.append(
             _LocalScope(
                 name=node.name,
-                body=node.body.copy(),
+                body=node.body,
                 args=[arg.arg for arg in args],
             ),
         )
 
-    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
-        self._visit_callable(node)
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> Iterator[ast.AST]:
+        return self._visit_callable(node)
 
-    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
-        self._visit_callable(node)
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> Iterator[ast.AST]:
+        return self._visit_callable(node)
+
+
+class _SummaryRecorder(_NamesScanner):
+    # Records names events in order of appearance instead of resolving them. Since traversal doesn't depend on already
+    # known names, replaying these events on a scanner gives the same result as visiting the nodes themselves.
+
+    def __init__(self) -> None:
+        super().__init__(find_definitions=None, collect_imported_attrs=True)
+        self.events: list[tuple[str, ...]] = []
+
+    def record_import_from_module(self, module_name: str, name: str, alias: str | None = None) -> None:
+        self.events.append((_IMPORT, module_name, name, alias or ""))
+
+    def _record_definition(self, name: str) -> None:
+        self.events.append((_DEFINITION, name))
+
+    def _record_undefined_name(self, name: str) -> None:
+        self.events.append((_USAGE, name))
+
+    def _record_attr_usage(self, name: str, attr: str) -> None:
+        self.events.append((_ATTR_USAGE, name, attr))
+
+    def _record_all_names(self, names: tuple[str, ...] | None) -> None:
+        self.events.append((_UNKNOWN_ALL_NAMES,) if names is None else (_ALL_NAMES, *names))
+
+    def _extend_all_names(self, names: tuple[str, ...] | None) -> None:
+        self.events.append((_UNKNOWN_ALL_NAMES,) if names is None else (_EXTEND_ALL_NAMES, *names))
+
+
+def _summarize_scope(nodes: list[ast.stmt], args: list[str] | None = None) -> _ScopeSummary:
+    recorder = _SummaryRecorder()
+    for node in nodes:
+        recorder.visit(node)
+
+    scopes = []
+    for scope in recorder._scope.internal_scopes:  # noqa: SLF001
+        if isinstance(scope, _ScopeSummary):
+            scopes.append(scope)
+        else:
+            scopes.append(_summarize_scope(scope.body, scope.args))
+    return _ScopeSummary(events=tuple(recorder.events), scopes=tuple(scopes), args=tuple(args or ()))
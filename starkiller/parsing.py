@@ -1,9 +1,14 @@
 """Utilities to parse Python code."""
 
 import ast
+import bisect
 import itertools
+import re
+from collections.abc import Generator, Iterable
+from functools import cached_property
 
 import parso
+from parso.python.tree import Module as ParsoModule
 
 from starkiller.models import (
     EditPosition,
@@ -12,12 +17,20 @@ from starkiller.models import (
     ImportFromStatement,
     ImportModulesStatement,
     ModuleNames,
+    _ScopeSummary,
 )
-from starkiller.names_scanner import _NamesScanner
+from starkiller.names_scanner import _NamesScanner, _summarize_scope
+from starkiller.stats import count
+
+# Minimal number of lines parsed at once when looking for specific definitions
+CHUNK_MIN_LINES = 200
+# Clauses of compound statements that start at the same indentation level as the statement itself, e.g. `except:`,
+# `except(KeyError):` or `except* KeyError:`
+_CLAUSE_RE = re.compile(r"(?:else|elif|except|finally)\b")
 
 
 def parse_module(
-    code: str,
+    code: str | ast.Module,
     find_definitions: set[str] | None = None,
     *,
     check_internal_scopes: bool = False,
@@ -25,8 +38,11 @@ def parse_module(
 ) -> ModuleNames:
     """Parse Python source and find all definitions, undefined symbols usages and imported names.
 
+    If looking for specific definitions in source code, top level statements are parsed chunk by chunk and parsing
+    stops as soon as all of them are found, so the rest of the module is neither parsed nor checked for syntax errors.
+
     Args:
-        code: Source code to be parsed.
+        code: Source code to be parsed or its AST.
         find_definitions: Optional set of definitions to look for.
         check_internal_scopes: If False, won't parse function and classes definitions.
         collect_imported_attrs: If True, will record attribute usages of ast.Name nodes.
@@ -35,7 +51,14 @@ def parse_module(
         ModuleNames object.
     """
     visitor = _NamesScanner(find_definitions=find_definitions, collect_imported_attrs=collect_imported_attrs)
-    visitor.visit(ast.parse(code))
+    if isinstance(code, str) and find_definitions:
+        for chunk in _iter_parsed_chunks(code):
+            for node in chunk.body:
+                visitor.visit(node)
+            if visitor.found_all:
+                break
+    else:
+        visitor.visit(ast.parse(code) if isinstance(code, str) else code)
     if check_internal_scopes:
         visitor.visit_internal_scopes()
     return ModuleNames(
@@ -43,20 +66,83 @@ def parse_module(
         defined=visitor.defined,
         import_map=visitor.import_map,
         attr_usages=visitor.attr_usages,
+        all_names=visitor.all_names,
     )
 
 
-def find_imports(source: str, line_no: int) -> ImportModulesStatement | ImportFromStatement | None:
+def _starts_statement(line: str) -> bool:
+    # Statements nested in blocks, comments, closing brackets and clauses of compound statements are not top level
+    if not line or line[0].isspace() or line[0] in "#)]}":
+        return False
+    return _CLAUSE_RE.match(line) is None
+
+
+def _iter_parsed_chunks(code: str) -> Generator[ast.Module]:
+    # Split source into chunks of whole top level statements and parse them one by one. A line looking like a statement
+    # start may still be inside a multiline string or brackets, then the chunk doesn't parse and grows further.
+    lines = code.splitlines(keepends=True)
+    start = 0
+    next_attempt = CHUNK_MIN_LINES
+    for line_no in range(CHUNK_MIN_LINES, len(lines)):
+        if line_no < next_attempt or not _starts_statement(lines[line_no]):
+            continue
+
+        try:
+            chunk = ast.parse("".join(lines[start:line_no]))
+        except SyntaxError:
+            # Back off to keep retries of long multiline strings from parsing the same lines over and over again
+            next_attempt = line_no + line_no - start
+            continue
+
+        yield chunk
+        start = line_no
+        next_attempt = line_no + CHUNK_MIN_LINES
+
+    # Errors in the last chunk are real syntax errors
+    yield ast.parse("".join(lines[start:]))
+
+
+def parse_summaries(
+    summaries: Iterable[_ScopeSummary],
+    *,
+    check_internal_scopes: bool = False,
+    collect_imported_attrs: bool = False,
+) -> ModuleNames:
+    """Combine summaries of top level statements into module names.
+
+    Args:
+        summaries: Summaries of top level statements, in order of appearance.
+        check_internal_scopes: If False, won't check function and classes definitions.
+        collect_imported_attrs: If True, will record attribute usages of ast.Name nodes.
+
+    Returns:
+        ModuleNames object.
+    """
+    visitor = _NamesScanner(collect_imported_attrs=collect_imported_attrs)
+    for summary in summaries:
+        visitor.replay(summary)
+    if check_internal_scopes:
+        visitor.visit_internal_scopes()
+    return ModuleNames(
+        undefined=visitor.undefined,
+        defined=visitor.defined,
+        import_map=visitor.import_map,
+        attr_usages=visitor.attr_usages,
+        all_names=visitor.all_names,
+    )
+
+
+def find_imports(source: str | ParsoModule, line_no: int) -> ImportModulesStatement | ImportFromStatement | None:
     """Checks if given line of python code contains from import statement.
 
     Args:
-        source: Source code to check.
+        source: Source code to check or its parso tree.
         line_no: Line number containing possible import statement.
 
     Returns:
         Module name and ImportedName list or `(None, None)`.
     """
-    root = parso.parse(source)
+    root = parso.parse(source) if isinstance(source, str) else source
     node = root.get_leaf_for_position((line_no, 1), include_prefixes=True)
 
     while node is not None and node.type not in {"import_from", "import_name"}:
@@ -64,12 +150,65 @@ def find_imports(source: str, line_no: int) -> ImportModulesStatement | ImportFr
 
     if node is None:
         return None
+    return _get_import_statement(node)
+
+
+def iter_imports(source: str | ParsoModule) -> Generator[ImportModulesStatement | ImportFromStatement]:
+    """Find all module level import statements.
+
+    Imports nested in functions and classes are skipped, as star imports are only allowed on module level.
 
+    Args:
+        source: Source code to check or its parso tree.
+
+    Yields:
+        Import statements in order of appearance.
+    """
+    root = parso.parse(source) if isinstance(source, str) else source
+    for node in root.iter_imports():
+        statement = _get_import_statement(node)
+        if statement is not None:
+            yield statement
+
+
+def find_unused_imports(source: str | ParsoModule) -> dict[str, set[ImportedName]]:
+    """Find module level imports whose names are never used.
+
+    Star imports are not checked.
+
+    Args:
+        source: Source code to check or its parso tree.
+
+    Returns:
+        Unused imported names by module name, like in `ModuleNames.import_map`.
+    """
+    root = parso.parse(source) if isinstance(source, str) else source
+    used_names = root.get_used_names()
+    unused: dict[str, set[ImportedName]] = {}
+
+    for statement in iter_imports(root):
+        if isinstance(statement, ImportFromStatement):
+            imported = {statement.module: statement.names or set()}
+        else:
+            imported = {iname.name: {iname} for iname in statement.modules}
+
+        for module_name, inames in imported.items():
+            for iname in inames:
+                # `import a.b` binds `a`
+                bound_name = iname.alias or iname.name.split(".", maxsplit=1)[0]
+                nodes = used_names.get(bound_name, [])
+                if not any(node.search_ancestor("import_from", "import_name") is None for node in nodes):
+                    unused.setdefault(module_name, set()).add(iname)
+
+    return unused
+
+
+def _get_import_statement(node: parso.tree.NodeOrLeaf) -> ImportModulesStatement | ImportFromStatement | None:
     edit_range = EditRange(EditPosition(*node.start_pos), EditPosition(*node.end_pos))
 
     if isinstance(node, parso.python.tree.ImportFrom):
         module_path = [n.value for n in node.get_from_names()]
-        module = ".".join(module_path)
+        module = "." * node.level + ".".join(module_path)
         if node.is_star_import():
             return ImportFromStatement(module, edit_range, is_star=True)
 
@@ -87,3 +226,110 @@ def find_imports(source: str, line_no: int) -> ImportModulesStatement | ImportFr
         return ImportModulesStatement(set(imported_modules), edit_range)
 
     return None
+
+
+class SourceAnalysis:
+    """Parsed source code shared between several refactorings.
+
+    Each representation of the source is built once, on first access.
+
+    Successive versions of the same document can be analysed incrementally: given a cache key, the parso tree of the
+    previous version is updated with parso's diff parser, and module names are combined from per statement summaries,
+    so only changed top level statements are parsed and scanned again. The diff parser updates the previous tree in
+    place, so the previous analysis must not be used anymore.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        previous: "SourceAnalysis | None" = None,
+        diff_cache_key: str | None = None,
+    ) -> None:
+        """Inits analysis.
+
+        Args:
+            source: Source code to analyse.
+            previous: Optional analysis of the previous version of the same document.
+            diff_cache_key: Unique document identifier to enable incremental parsing.
+        """
+        self.source = source
+        self.diff_cache_key = diff_cache_key
+        self._previous = previous
+        self._statements: tuple[str, ...] | None = None
+        self._statement_lines: list[int] = []
+        self._summaries: dict[str, _ScopeSummary] = {}
+        if previous is not None:
+            # Keep a single version back
+            previous._previous = None  # noqa: SLF001
+
+    @cached_property
+    def parso_tree(self) -> ParsoModule:
+        """Parso tree of the source, used to generate edits."""
+        tree: ParsoModule
+        if self.diff_cache_key is None:
+            tree = parso.parse(self.source)
+        else:
+            tree = parso.load_grammar().parse(self.source, path=self.diff_cache_key, diff_cache=True)
+
+        # Remember top level statements now, the tree may be changed in place by the next version
+        self._statements = tuple(child.get_code(include_prefix=False) for child in tree.children)
+        self._statement_lines = [child.start_pos[0] for child in tree.children]
+        return tree
+
+    @cached_property
+    def ast_tree(self) -> ast.Module:
+        """AST of the source, used to scan names."""
+        return ast.parse(self.source)
+
+    @cached_property
+    def names(self) -> ModuleNames:
+        """Names of the module, including internal scopes and attribute usages."""
+        previous, self._previous = self._previous, None
+        if (
+            previous is not None
+            and "names" in vars(previous)
+            and previous._statements is not None  # noqa: SLF001
+            and self.statements == previous._statements  # noqa: SLF001
+        ):
+            # Keep summaries for the next version, which is compared with this one
+            self._summaries = previous._summaries  # noqa: SLF001
+            return previous.names
+        if self.diff_cache_key is None:
+            return parse_module(self.ast_tree, check_internal_scopes=True, collect_imported_attrs=True)
+
+        known = previous._summaries if previous is not None else {}  # noqa: SLF001
+        if any(code in known for code in self.statements):
+            self._summaries = {code: known[code] for code in self.statements if code in known}
+            for code in self.statements:
+                if code not in self._summaries:
+                    count("statements_summarized")
+                    self._summaries[code] = _summarize_scope(ast.parse(code).body)
+        else:
+            self._summaries = self._summarize_tree()
+        return parse_summaries(
+            (self._summaries[code] for code in self.statements),
+            check_internal_scopes=True,
+            collect_imported_attrs=True,
+        )
+
+    def _summarize_tree(self) -> dict[str, _ScopeSummary]:
+        # Parse the whole source at once and split AST statements between parso top level statements
+        groups: list[list[ast.stmt]] = [[] for _ in self.statements]
+        for node in self.ast_tree.body:
+            decorators = getattr(node, "decorator_list", [])
+            start_line = min([node.lineno, *(decorator.lineno for decorator in decorators)])
+            groups[bisect.bisect_right(self._statement_lines, start_line) - 1].append(node)
+        count("statements_summarized", len(groups))
+        return {code: _summarize_scope(group) for code, group in zip(self.statements, groups, strict=True)}
+
+    @property
+    def statements(self) -> tuple[str, ...]:
+        """Source code of top level statements, without comments and whitespace between them."""
+        if self._statements is None:
+            _ = self.parso_tree
+        return self._statements or ()
+
+    @cached_property
+    def used_names(self) -> dict[str, list[parso.python.tree.Name]]:
+        """Parso name leaves by name."""
+        return dict(self.parso_tree.get_used_names())
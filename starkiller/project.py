@@ -1,57 +1,121 @@
 """A class to work with imports in a Python project."""
 
-from importlib.util import spec_from_file_location
+import contextvars
+import logging
+import multiprocessing
+import re
+import threading
+from collections import Counter
+from collections.abc import Generator, Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from importlib.util import resolve_name
 from pathlib import Path
 
-# TODO: generate Jedi stub files
-from jedi import create_environment, find_system_environments  # type: ignore
-
-from starkiller.models import ImportedName, Module
-from starkiller.parsing import parse_module
-from starkiller.utils import BUILTIN_FUNCTIONS, BUILTIN_MODULES, STUB_STDLIB_SUBDIRS
-
-MODULE_EXTENSIONS = (".py", ".pyi")
-
-
-def _search_for_module(module_name: str, paths: list[Path]) -> Module | None:
-    file_candidates = []
-    dir_candidates = []
-    for path in paths:
-        for _, dirnames, filenames in path.walk():
-            filepaths = [Path(path / n) for n in filenames]
-            file_candidates.extend([
-                file for file in filepaths if (file.stem == module_name) and (file.suffix in MODULE_EXTENSIONS)
-            ])
-            dir_candidates.extend([path / dname for dname in dirnames if dname == module_name])
-            break
-
-    for file in file_candidates:
-        return Module(name=file.stem, fullname=file.stem, path=file)
-
-    for directory in dir_candidates:
-        init_path = directory / "__init__.py"
-        spec = spec_from_file_location(directory.stem, init_path, submodule_search_locations=[str(directory)])
-        if spec is not None:
-            return Module(name=directory.name, fullname=spec.name, path=init_path, submodule_paths=[directory])
-
-    return None
+from starkiller.cache import ModuleNamesCache, ModuleNamesStore
+from starkiller.import_graph import ImportGraph
+from starkiller.models import (
+    DefinitionsReport,
+    ImportedName,
+    ImportFromStatement,
+    ImportIssues,
+    Module,
+    ModuleNames,
+)
+from starkiller.module_index import DEFAULT_POLL_INTERVAL, ModuleIndex
+from starkiller.parsing import SourceAnalysis, find_unused_imports, iter_imports, parse_module
+from starkiller.stats import count, timer
+from starkiller.stdlib_index import StdlibExportsIndex, get_index_file_name
+from starkiller.utils import (
+    get_builtin_names,
+    get_stdlib_dirs,
+    get_stub_stdlib_subdirs,
+    iter_python_files,
+)
+
+log = logging.getLogger(__name__)
+
+# Good enough to count star imports without parsing, e.g. `from .module import *`
+_STAR_IMPORT_RE = re.compile(r"^[ \t]*from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+\*", re.MULTILINE)
 
 
 class StarkillerProject:
-    """Class to analyse imports in a Python project."""
+    """Class to analyse imports in a Python project.
 
-    def __init__(self, project_path: Path | str, env_path: Path | str | None = None) -> None:
+    A project can be queried from several threads at once, its caches and lazily created state are thread safe.
+    """
+
+    def __init__(
+        self,
+        project_path: Path | str,
+        env_path: Path | str | None = None,
+        *,
+        cache_size: int = 256,
+        persistent_cache: Path | str | None = None,
+        workers: int = 0,
+    ) -> None:
         """Inits project.
 
         Args:
             project_path: Path to the project root.
             env_path: Optional path to the project virtual environment.
+            cache_size: Maximum number of parsed modules to keep in memory.
+            persistent_cache: Optional path to an on-disk cache of parsed modules, shared between sessions. The
+                standard library exports index is kept next to it.
+            workers: Number of threads and processes to parse star imported modules concurrently with. Zero parses
+                them one by one.
         """
+        # Jedi is slow to import, so it is only loaded once a project is created
+        # TODO: generate Jedi stub files
+        from jedi import __version__ as jedi_version  # type: ignore  # noqa: PLC0415
+        from jedi import create_environment, find_system_environments  # type: ignore  # noqa: PLC0415
+
         self.path = Path(project_path)
-        if env_path:
-            self.env = create_environment(path=env_path, safe=False)
-        else:
-            self.env = next(find_system_environments())
+        with timer("jedi_environment"):
+            if env_path:
+                self.env = create_environment(path=env_path, safe=False)
+            else:
+                self.env = next(find_system_environments())
+            env_sys_paths = [Path(p) for p in self.env.get_sys_path()[::-1]]
+
+        self._top_level_paths = [self.path, *env_sys_paths]
+        self._module_index = ModuleIndex(poll_interval=DEFAULT_POLL_INTERVAL)
+        store = ModuleNamesStore(persistent_cache) if persistent_cache else None
+        self._names_cache = ModuleNamesCache(maxsize=cache_size, store=store)
+
+        # Only the interpreter own directories, other entries of its path may be changed by the user
+        with timer("jedi_environment"):
+            stdlib_dirs = get_stdlib_dirs(self.env.executable)
+        self._stdlib_paths = [*stdlib_dirs, *get_stub_stdlib_subdirs()]
+        index_path = None
+        if persistent_cache:
+            index_name = get_index_file_name(tuple(self.env.version_info), jedi_version, stdlib_dirs)
+            index_path = Path(persistent_cache).with_name(index_name)
+        self._stdlib_index = StdlibExportsIndex(index_path)
+
+        # Built on first request
+        self._import_graph: ImportGraph | None = None
+
+        # Guards lazily created state: the import graph and worker pools
+        self._lock = threading.Lock()
+
+        # Worker pools are started on the first lookup that needs them
+        self._workers = workers
+        self._thread_pool: ThreadPoolExecutor | None = None
+        self._process_pool: ProcessPoolExecutor | None = None
+
+    def close(self) -> None:
+        """Stop worker pools and close the on-disk cache."""
+        with self._lock:
+            thread_pool, self._thread_pool = self._thread_pool, None
+            process_pool, self._process_pool = self._process_pool, None
+        if thread_pool is not None:
+            thread_pool.shutdown(cancel_futures=True)
+        if process_pool is not None:
+            process_pool.shutdown(cancel_futures=True)
+        if self._names_cache.store is not None:
+            self._names_cache.store.close()
 
     def find_module(self, module_name: str) -> Module | None:
         """Get module object by its name.
@@ -62,27 +126,81 @@ class StarkillerProject:
         Returns:
             Module object
         """
+        count("modules_looked_up")
         lineage = module_name.split(".")
+        module = self._find_lineage(lineage, self._top_level_paths)
+        if module is None:
+            # Built-in and extension modules, as well as modules set up at runtime like `os.path`, only exist as stubs
+            module = self._find_lineage(lineage, get_stub_stdlib_subdirs())
+        return module
 
+    def _find_lineage(self, lineage: list[str], top_level_paths: Sequence[Path]) -> Module | None:
         prev_module: Module | None = None
         for lineage_module_name in lineage:
-            prev_module = self._find_module(lineage_module_name, prev_module)
-
+            prev_module = self._find_module(lineage_module_name, prev_module, top_level_paths)
+            if prev_module is None:
+                return None
         return prev_module
 
-    def _find_module(self, module_name: str, parent_module: Module | None) -> Module | None:
+    def get_module_name(self, path: Path | str) -> str | None:
+        """Get full name of a project module by its path.
+
+        Args:
+            path: Path to the module file.
+
+        Returns:
+            Module name, e.g. `"package.module"` for `package/module.py`, or None if the file is not in the project.
+        """
+        try:
+            relative_path = Path(path).resolve().relative_to(self.path.resolve())
+        except ValueError:
+            return None
+
+        parts = list(relative_path.with_suffix("").parts)
+        if parts and parts[-1] == "__init__":
+            parts.pop()
+        return ".".join(parts) or None
+
+    def resolve_import(self, module_name: str, importer_path: Path | str | None) -> str | None:
+        """Get absolute name of an imported module.
+
+        Args:
+            module_name: Imported module name, possibly relative, e.g. `"..utils"`.
+            importer_path: Path to the importing file, used to resolve relative imports.
+
+        Returns:
+            Absolute module name or None if a relative import can't be resolved.
+        """
+        if not module_name.startswith("."):
+            return module_name
+        if importer_path is None:
+            return None
+
+        importer_name = self.get_module_name(importer_path)
+        if importer_name is None:
+            return None
+        is_package = Path(importer_path).stem == "__init__"
+        package = importer_name if is_package else importer_name.rpartition(".")[0]
+
+        try:
+            return resolve_name(module_name, package)
+        except ImportError:
+            return None
+
+    def _find_module(
+        self,
+        module_name: str,
+        parent_module: Module | None,
+        top_level_paths: Sequence[Path],
+    ) -> Module | None:
         if parent_module is None:
-            env_sys_paths = [Path(p) for p in self.env.get_sys_path()[::-1]]
-            paths = [self.path, *env_sys_paths]
+            paths = list(top_level_paths)
         elif parent_module.submodule_paths is None:
             return None
         else:
             paths = parent_module.submodule_paths
 
-        if module_name in BUILTIN_MODULES:
-            paths.extend(STUB_STDLIB_SUBDIRS)
-
-        module = _search_for_module(module_name, paths)
+        module = self._module_index.find(module_name, paths)
         if module is not None and parent_module is not None:
             module.fullname = parent_module.fullname + "." + module.name
         return module
@@ -97,34 +215,366 @@ class StarkillerProject:
         Returns:
             Set of found names
         """
-        find_definitions -= BUILTIN_FUNCTIONS
+        return self.explain_definitions(module_name, find_definitions).found
+
+    def explain_definitions(self, module_name: str, find_definitions: set[str]) -> DefinitionsReport:
+        """Find definitions in module or package and report how they were resolved.
+
+        Each module is resolved once per query, even if it is star imported by several modules, and star import cycles
+        are cut, so resolution time is linear in the number of explored modules.
+
+        Args:
+            module_name: Full name of the module, e.g. "jedi.api".
+            find_definitions: Set of definitions to look for.
+
+        Returns:
+            DefinitionsReport object.
+        """
+        if self._workers > 0:
+            module = self.find_module(module_name)
+            if module is not None:
+                self._prefetch_star_imports(module)
+
+        resolution = _Resolution(find_definitions - get_builtin_names())
+        found = self._resolve_definitions(module_name, resolution)
+        return DefinitionsReport(
+            module=module_name,
+            found=set(found or ()),
+            modules=resolution.modules,
+            star_imports=resolution.star_imports,
+            cycles=resolution.cycles,
+            unresolved=[name for name, names in resolution.memo.items() if names is None],
+        )
+
+    def _resolve_definitions(self, module_name: str, resolution: "_Resolution") -> set[str] | None:
+        # Names of the query provided by the module, None if it can't be found. The result doesn't depend on where the
+        # module was reached from, so it is memoized for the whole query.
+        if module_name in resolution.memo:
+            count("resolution_memo_hits")
+            return resolution.memo[module_name]
+
+        if module_name in resolution.stack:
+            # Names the cycle provides are collected by the module that started it, which is still being resolved
+            cycle_start = resolution.stack.index(module_name)
+            resolution.cycles.append((*resolution.stack[cycle_start:], module_name))
+            return set()
+
+        count("find_definitions_calls")
+        resolution.modules.append(module_name)
+        resolution.stack.append(module_name)
+        try:
+            found = self._find_module_definitions(module_name, resolution)
+        finally:
+            resolution.stack.pop()
+        resolution.memo[module_name] = found
+        return found
+
+    def _find_module_definitions(self, module_name: str, resolution: "_Resolution") -> set[str] | None:
+        find_definitions = resolution.find_definitions
         found_definitions: set[str]
 
-        # Find the module location
+        # Find the module location. Names of modules that can't be found are unknown rather than missing.
         module = self.find_module(module_name)
         if module is None:
-            return set()
+            return None
+
+        # Standard library exports are known in advance
+        stdlib_exports = self._get_stdlib_exports(module)
+        if stdlib_exports is not None:
+            return find_definitions & stdlib_exports
 
         # Scan the module file for defintions
-        with module.path.open() as module_file:
-            names = parse_module(module_file.read(), find_definitions)
-        found_definitions = names.defined
+        names = self._names_cache.parse(module.path)
+
+        # Star imports provide exactly the names listed in `__all__`, no need to follow imports
+        if names.all_names is not None:
+            count("all_names_shortcuts")
+            return find_definitions & names.all_names
+
+        found_definitions = names.defined & find_definitions
 
         # If package, its submodules should be importable
         if module.package:
             found_definitions.update(self._find_submodules(module_name, find_definitions - found_definitions))
 
         # Follow imports
+        package = _get_package_name(module_name, is_package=module.package)
         for imod, inames in names.import_map.items():
             # Check what do we have left
             find_in_submod = find_definitions - found_definitions
             if not find_in_submod:
                 return found_definitions
 
-            found_definitions.update(self._find_definitions_follow_import(module_name, imod, inames, find_in_submod))
+            full_imod = _resolve_import_name(imod, package)
+            found_definitions.update(
+                self._find_definitions_follow_import(module_name, full_imod, inames, find_in_submod, resolution),
+            )
 
         return found_definitions
 
+    def resolve_star_imports(
+        self,
+        source: str | SourceAnalysis,
+        path: Path | str | None = None,
+    ) -> list[tuple[ImportFromStatement, set[str]]]:
+        """Find used names provided by each star import of a source.
+
+        If several star imports provide the same name, it is attributed to the last one, like at runtime.
+
+        Args:
+            source: Source code or its analysis.
+            path: Optional path to the source file, required to resolve relative imports.
+
+        Returns:
+            Star import statements in order of appearance and names they provide. Relative imports that can't be
+            resolved, modules that can't be found and modules that can't be read or parsed are skipped, as the names
+            they provide are unknown.
+        """
+        analysis = SourceAnalysis(source) if isinstance(source, str) else source
+        star_imports = [
+            statement
+            for statement in iter_imports(analysis.parso_tree)
+            if isinstance(statement, ImportFromStatement) and statement.is_star
+        ]
+        if not star_imports:
+            return []
+
+        resolved: list[tuple[ImportFromStatement, set[str]]] = []
+        undefined_names = set(analysis.names.undefined)
+        for statement in reversed(star_imports):
+            module_name = self.resolve_import(statement.module, path)
+            if module_name is None or self.find_module(module_name) is None:
+                continue
+
+            try:
+                found_names = self.find_definitions(module_name, set(undefined_names)) if undefined_names else set()
+            except (OSError, UnicodeDecodeError, SyntaxError) as err:
+                log.warning("Can't resolve star import of %s: %s", module_name, err)
+                continue
+            undefined_names -= found_names
+            resolved.append((statement, found_names))
+
+        return resolved[::-1]
+
+    def invalidate(self, paths: Iterable[Path | str]) -> set[str]:
+        """Drop cached data of created, deleted or changed files.
+
+        Parsed modules and directory listings are checked for changes on their own, but only every now and then or
+        when the file is used again. Invalidation takes changes into account immediately, e.g. on file save. Only the
+        changed files are evicted, everything else stays cached. Indexed exports of standard library modules are never
+        checked for changes, so they are only dropped here, along with exports of their parent packages.
+
+        Args:
+            paths: Paths to changed files or directories.
+
+        Returns:
+            Names of affected project modules: changed ones and the ones star importing them, directly or not. The
+            latter are known only if the import graph was built.
+        """
+        changed_paths = [Path(path) for path in paths]
+        stdlib_names: set[str] = set()
+        for path in changed_paths:
+            self._names_cache.evict(path)
+            self._module_index.invalidate(path)
+            # Packages usually re-export their modules, so indexed exports of parent packages are dropped as well
+            stdlib_name = self._get_stdlib_module_name(path)
+            while stdlib_name:
+                stdlib_names.add(stdlib_name)
+                stdlib_name = stdlib_name.rpartition(".")[0]
+        self._stdlib_index.discard(stdlib_names)
+        self.update_import_graph(changed_paths)
+
+        affected: set[str] = set()
+        queue = [name for name in map(self.get_module_name, changed_paths) if name is not None]
+        while queue:
+            module_name = queue.pop()
+            if module_name in affected:
+                continue
+            affected.add(module_name)
+            import_graph = self._import_graph
+            if import_graph is not None:
+                queue.extend(import_graph.get_star_importers(module_name))
+        return affected
+
+    def count_star_imports(self, paths: Iterable[Path | str]) -> Counter[str]:
+        """Count star imports of each module in Python files.
+
+        Files are scanned for import statements with a regular expression instead of being parsed, so this is fast
+        enough to run on a whole project but may be fooled by star imports in strings.
+
+        Args:
+            paths: Files and directories to scan.
+
+        Returns:
+            Number of star imports by absolute module name.
+        """
+        counter: Counter[str] = Counter()
+        for path in iter_python_files(Path(p) for p in paths):
+            try:
+                source = path.read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                continue
+            for match in _STAR_IMPORT_RE.finditer(source):
+                module_name = self.resolve_import(match[1], path)
+                if module_name is not None:
+                    counter[module_name] += 1
+        return counter
+
+    def warm_up(self, module_name: str) -> None:
+        """Fill caches used to resolve star imports of a module.
+
+        The module and modules it star imports are parsed, exports of standard library modules among them are indexed.
+        Later lookups of the module only hit the caches.
+
+        Args:
+            module_name: Full name of the module.
+        """
+        module = self.find_module(module_name)
+        if module is not None and self._get_stdlib_exports(module) is None:
+            self._prefetch_star_imports(module, index_stdlib=True)
+
+    def get_import_graph(self) -> ImportGraph:
+        """Get graph of imports between project modules.
+
+        The graph is built on the first call by scanning all Python files of the project and is kept afterwards. Call
+        `update_import_graph` on file changes to keep it up to date.
+
+        Returns:
+            ImportGraph object shared between callers.
+        """
+        with self._lock:
+            if self._import_graph is None:
+                # Other threads wait for the graph instead of building their own
+                graph = ImportGraph()
+                with timer("import_graph"):
+                    self._scan_into_graph(graph, iter_python_files([self.path]))
+                self._import_graph = graph
+            return self._import_graph
+
+    def update_import_graph(self, paths: Iterable[Path | str]) -> None:
+        """Rescan changed, created or deleted project files in the import graph.
+
+        Does nothing if the graph wasn't built yet.
+
+        Args:
+            paths: Paths to changed files. Files outside the project are ignored.
+        """
+        with self._lock:
+            if self._import_graph is not None:
+                self._scan_into_graph(self._import_graph, (Path(path) for path in paths))
+
+    def _scan_into_graph(self, graph: ImportGraph, paths: Iterable[Path]) -> None:
+        for path in paths:
+            module_name = self.get_module_name(path)
+            if module_name is None:
+                continue
+
+            try:
+                names = self._names_cache.parse(path)
+            except (OSError, UnicodeDecodeError, SyntaxError):
+                # Deleted or broken files import nothing
+                graph.remove(module_name)
+                continue
+
+            count("graph_modules_scanned")
+            imports: dict[str, set[ImportedName]] = {}
+            for imodule_name, inames in names.import_map.items():
+                full_imodule_name = self.resolve_import(imodule_name, path)
+                if full_imodule_name is not None:
+                    imports.setdefault(full_imodule_name, set()).update(inames)
+            graph.update(module_name, path, imports)
+
+    def iter_import_issues(self, paths: Iterable[Path | str]) -> Generator[ImportIssues]:
+        """Check imports of Python files one by one.
+
+        Results are yielded as soon as a file is checked and nothing is kept between files except for the project
+        caches, so memory usage doesn't depend on the number of files.
+
+        Args:
+            paths: Files and directories to check.
+
+        Yields:
+            ImportIssues object for each Python file.
+        """
+        for path in iter_python_files(Path(p) for p in paths):
+            try:
+                analysis = SourceAnalysis(path.read_text(encoding="utf-8"))
+                # Parso recovers from syntax errors, so make sure the file is valid
+                _ = analysis.ast_tree
+                star_imports = self.resolve_star_imports(analysis, path)
+                unused_imports = find_unused_imports(analysis.parso_tree)
+            except (OSError, UnicodeDecodeError, SyntaxError) as err:
+                yield ImportIssues(path, error=str(err))
+                continue
+
+            yield ImportIssues(
+                path,
+                star_imports=star_imports,
+                unused_imports=unused_imports,
+            )
+
+    def _is_stdlib_module(self, module: Module) -> bool:
+        return self._get_stdlib_module_name(module.path) is not None
+
+    def _get_stdlib_module_name(self, path: Path) -> str | None:
+        # Relative to the deepest directory, e.g. extension modules are in lib-dynload inside the standard library
+        stdlib_paths = [stdlib_path for stdlib_path in self._stdlib_paths if path.is_relative_to(stdlib_path)]
+        if not stdlib_paths:
+            return None
+        parts = list(path.relative_to(max(stdlib_paths, key=lambda p: len(p.parts))).parts)
+
+        # Installed packages may live inside the standard library directory
+        if not parts or {"site-packages", "dist-packages"} & set(parts):
+            return None
+        parts[-1] = parts[-1].partition(".")[0]
+        if parts[-1] == "__init__":
+            parts.pop()
+        return ".".join(parts) or None
+
+    def _get_stdlib_exports(self, module: Module) -> frozenset[str] | None:
+        if not self._is_stdlib_module(module):
+            return None
+
+        exports = self._stdlib_index.get(module.fullname)
+        if exports is None:
+            count("stdlib_modules_indexed")
+            exports = self._collect_exports(module, {module.fullname})
+            self._stdlib_index.add(module.fullname, exports)
+        else:
+            count("stdlib_index_hits")
+        return exports
+
+    def _collect_exports(self, module: Module, visiting: set[str]) -> frozenset[str]:
+        # Names bound by `from module import *`, following star imports recursively
+        names = self._names_cache.parse(module.path)
+        if names.all_names is not None:
+            return frozenset(names.all_names)
+
+        # Stubs only re-export names imported with a redundant alias
+        is_stub = module.path.suffix == ".pyi"
+        exports = set(names.defined)
+        for imodule_name, inames in names.import_map.items():
+            for iname in inames:
+                if iname.name == "*":
+                    exports.update(self._collect_star_exports(module, imodule_name, visiting))
+                elif not is_stub or iname.alias == iname.name:
+                    exports.add(iname.alias or iname.name.partition(".")[0])
+        return frozenset(name for name in exports if not name.startswith("_"))
+
+    def _collect_star_exports(self, module: Module, imodule_name: str, visiting: set[str]) -> frozenset[str]:
+        package = _get_package_name(module.fullname, is_package=module.package)
+        full_imodule_name = _resolve_import_name(imodule_name, package)
+        if full_imodule_name is None or full_imodule_name in visiting:
+            return frozenset()
+
+        exports = self._stdlib_index.get(full_imodule_name)
+        if exports is not None:
+            return exports
+        imodule = self.find_module(full_imodule_name)
+        if imodule is None:
+            return frozenset()
+        return self._collect_exports(imodule, visiting | {full_imodule_name})
+
     def _find_submodules(self, module_name: str, find_submodules: set[str]) -> set[str]:
         found_submodules: set[str] = set()
 
@@ -139,26 +589,117 @@ class StarkillerProject:
     def _find_definitions_follow_import(
         self,
         module_name: str,
-        imodule_name: str,
+        full_imodule_name: str | None,
         inames: set[ImportedName],
-        find_definitions: set[str]
+        find_definitions: set[str],
+        resolution: "_Resolution",
     ) -> set[str]:
-        module_short_name = module_name.rsplit(".", maxsplit=1)[-1]
         found_definitions: set[str] = set()
 
         is_star = any(iname.name == "*" for iname in inames)
-        is_relative_internal = imodule_name.startswith(".") and not imodule_name.startswith("..")
-        is_internal = imodule_name.startswith((module_short_name, module_name)) or is_relative_internal
-        if not is_internal:
-            pass
-
-        full_imodule_name = module_name + imodule_name if is_relative_internal else imodule_name
 
         if is_star:
-            submodule_definitions = self.find_definitions(full_imodule_name, find_definitions)
-            found_definitions.update(submodule_definitions)
+            # Relative imports beyond the top level package can't be followed
+            if full_imodule_name is None:
+                return found_definitions
+            resolution.star_imports.append((module_name, full_imodule_name))
+            submodule_definitions = self._resolve_definitions(full_imodule_name, resolution)
+            if submodule_definitions is not None:
+                found_definitions.update(submodule_definitions & find_definitions)
         else:
             imported_from_submodule = {iname.name for iname in inames}
             found_definitions.update(imported_from_submodule & find_definitions)
 
         return found_definitions
+
+    def _prefetch_star_imports(self, module: Module, *, index_stdlib: bool = False) -> None:
+        # Parse modules reachable through star imports level by level, each level concurrently if workers are enabled,
+        # so that the sequential resolution only hits the cache. Standard library modules aren't parsed, but their
+        # exports can be indexed.
+        seen = {module.path}
+        level = [module]
+        while level:
+            with timer("prefetch"):
+                level_paths = [level_module.path for level_module in level]
+                if self._workers > 0:
+                    level_names = self._parse_concurrently(level_paths)
+                else:
+                    level_names = [self._parse_file(path) for path in level_paths]
+
+            next_level = []
+            for level_module, names in zip(level, level_names, strict=True):
+                if names is None or names.all_names is not None:
+                    continue
+                package = _get_package_name(level_module.fullname, is_package=level_module.package)
+                for imodule_name, inames in names.import_map.items():
+                    if not any(iname.name == "*" for iname in inames):
+                        continue
+                    full_imodule_name = _resolve_import_name(imodule_name, package)
+                    imodule = None if full_imodule_name is None else self.find_module(full_imodule_name)
+                    if imodule is None or imodule.path in seen:
+                        continue
+                    seen.add(imodule.path)
+                    if not self._is_stdlib_module(imodule):
+                        next_level.append(imodule)
+                    elif index_stdlib:
+                        self._get_stdlib_exports(imodule)
+            level = next_level
+
+    def _parse_concurrently(self, paths: list[Path]) -> list[ModuleNames | None]:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="starkiller")
+            if self._process_pool is None:
+                # Forking a multithreaded process is unsafe, and spawned workers don't need much
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            thread_pool = self._thread_pool
+
+        # Keep collecting statistics of the current request in worker threads
+        context = contextvars.copy_context()
+        futures = [thread_pool.submit(context.copy().run, self._parse_file, path) for path in paths]
+        return [future.result() for future in futures]
+
+    def _parse_file(self, path: Path) -> ModuleNames | None:
+        # File I/O runs in a worker thread, parsing itself in a worker process to sidestep the GIL
+        try:
+            return self._names_cache.parse(path, parser=self._parse_in_process)
+        except (OSError, UnicodeDecodeError, SyntaxError):
+            # Leave errors to the sequential resolution
+            return None
+
+    def _parse_in_process(self, source: str) -> ModuleNames:
+        process_pool = self._process_pool
+        if process_pool is not None:
+            try:
+                return process_pool.submit(parse_module, source).result()
+            except (BrokenProcessPool, RuntimeError):
+                # Workers can't be started (e.g. in an unguarded `__main__`) or the project was closed meanwhile
+                pass
+        return parse_module(source)
+
+
+@dataclass
+class _Resolution:
+    # State of a single find_definitions query
+    find_definitions: set[str]
+    memo: dict[str, set[str] | None] = field(default_factory=dict)
+    stack: list[str] = field(default_factory=list)
+    modules: list[str] = field(default_factory=list)
+    star_imports: list[tuple[str, str]] = field(default_factory=list)
+    cycles: list[tuple[str, ...]] = field(default_factory=list)
+
+
+def _get_package_name(module_name: str, *, is_package: bool) -> str:
+    # Package relative imports of a module are resolved against
+    return module_name if is_package else module_name.rpartition(".")[0]
+
+
+def _resolve_import_name(imodule_name: str, package: str) -> str | None:
+    # Absolute name of a module imported by another module, None for relative imports beyond the top level package
+    try:
+        return resolve_name(imodule_name, package)
+    except ImportError:
+        return None
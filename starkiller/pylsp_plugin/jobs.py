@@ -0,0 +1,144 @@
+import contextvars
+import dataclasses
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+MAX_CACHED_DOCUMENTS = 16
+MAX_CACHED_LINES = 32
+
+
+# Set in background jobs, to stop them once their results are outdated
+_job_cancelled: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar(
+    "starkiller_job_cancelled",
+    default=None,
+)
+
+
+def check_cancelled() -> None:
+    """Stop the current background job if it was cancelled."""
+    cancelled = _job_cancelled.get()
+    if cancelled is not None and cancelled.is_set():
+        raise CancelledError
+
+
+def _run_job(cancelled: threading.Event, func: Callable[[], Any]) -> Any:  # noqa: ANN401
+    _job_cancelled.set(cancelled)
+    check_cancelled()
+    return func()
+
+
+@dataclasses.dataclass
+class _DocumentJobs:
+    # Code actions for a document version by line number, being computed or done
+    version: int | None
+    cancelled: threading.Event = dataclasses.field(default_factory=threading.Event)
+    lines: OrderedDict[int, Future[list[dict[str, Any]]]] = dataclasses.field(default_factory=OrderedDict)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        for future in self.lines.values():
+            future.cancel()
+
+
+class BackgroundJobs:
+    # Expensive requests run in worker threads, so the server keeps responding to other requests meanwhile. Code
+    # actions are computed one at a time and kept for the document version they were computed for. Jobs of outdated
+    # versions are cancelled: pending ones are dropped and running ones stop at the next `check_cancelled` call.
+
+    def __init__(self, max_documents: int = MAX_CACHED_DOCUMENTS) -> None:
+        self._max_documents = max_documents
+        self._lock = threading.Lock()
+        self._code_actions_executor: ThreadPoolExecutor | None = None
+        self._workspace_executor: ThreadPoolExecutor | None = None
+        self._documents: OrderedDict[str, _DocumentJobs] = OrderedDict()
+        self._workspace_cancelled: dict[str, threading.Event] = {}
+
+    def get_code_actions(
+        self,
+        uri: str,
+        version: int | None,
+        line_no: int,
+        compute: Callable[[], list[dict[str, Any]]],
+    ) -> Future[list[dict[str, Any]]]:
+        with self._lock:
+            jobs = self._documents.get(uri)
+            # Documents without version are always recomputed
+            if jobs is None or version is None or jobs.version != version:
+                if jobs is not None:
+                    jobs.cancel()
+                jobs = _DocumentJobs(version)
+                self._documents[uri] = jobs
+            self._documents.move_to_end(uri)
+            while len(self._documents) > self._max_documents:
+                _, dropped = self._documents.popitem(last=False)
+                dropped.cancel()
+
+            future = jobs.lines.get(line_no)
+            # Cancelled and failed jobs are run again, failures may be transient, e.g. a project recreated meanwhile
+            failed = future is not None and future.done() and (future.cancelled() or future.exception() is not None)
+            if future is None or failed:
+                # The cursor moved on, requests for other lines which haven't started yet are superseded
+                for other_line_no, other_future in list(jobs.lines.items()):
+                    if other_future.cancel():
+                        del jobs.lines[other_line_no]
+
+                if self._code_actions_executor is None:
+                    self._code_actions_executor = ThreadPoolExecutor(1, thread_name_prefix="starkiller-actions")
+                context = contextvars.copy_context()
+                future = self._code_actions_executor.submit(context.run, _run_job, jobs.cancelled, compute)
+                jobs.lines[line_no] = future
+            jobs.lines.move_to_end(line_no)
+            while len(jobs.lines) > MAX_CACHED_LINES:
+                jobs.lines.popitem(last=False)
+            return future
+
+    def cancel_outdated(self, uri: str, version: int | None) -> None:
+        with self._lock:
+            jobs = self._documents.get(uri)
+            if jobs is not None and (version is None or jobs.version != version):
+                jobs.cancel()
+                del self._documents[uri]
+
+    def run_in_workspace(self, name: str, func: Callable[[], object]) -> Future[Any]:
+        # Only the latest workspace wide job of each kind is useful
+        with self._lock:
+            previous = self._workspace_cancelled.get(name)
+            if previous is not None:
+                previous.set()
+            cancelled = self._workspace_cancelled[name] = threading.Event()
+            if self._workspace_executor is None:
+                self._workspace_executor = ThreadPoolExecutor(1, thread_name_prefix="starkiller-workspace")
+            context = contextvars.copy_context()
+            future = self._workspace_executor.submit(context.run, _run_job, cancelled, func)
+        future.add_done_callback(_log_job_error)
+        return future
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for jobs in self._documents.values():
+                jobs.cancel()
+            self._documents.clear()
+            for cancelled in self._workspace_cancelled.values():
+                cancelled.set()
+            self._workspace_cancelled.clear()
+            for executor in (self._code_actions_executor, self._workspace_executor):
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+            self._code_actions_executor = None
+            self._workspace_executor = None
+
+
+def _log_job_error(future: Future[Any]) -> None:
+    if future.cancelled():
+        return
+    err = future.exception()
+    if isinstance(err, CancelledError):
+        log.debug("Background job was cancelled")
+    elif err is not None:
+        log.error("Background job failed", exc_info=err)
@@ -1,24 +1,44 @@
+import contextlib
+import cProfile
 import dataclasses
+import itertools
 import logging
 import pathlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Generator
+from concurrent.futures import CancelledError
 from typing import Any
 
 from lsprotocol.converters import get_converter  # type: ignore
 from lsprotocol.types import (  # type: ignore
     CodeAction,
     CodeActionKind,
+    Command,
     Position,
     Range,
     TextEdit,
     WorkspaceEdit,
 )
-from pylsp import hookimpl  # type: ignore
+from pylsp import hookimpl, uris  # type: ignore
 from pylsp.config.config import Config  # type: ignore
 from pylsp.workspace import Document, Workspace  # type: ignore
 
-from starkiller.parsing import ImportedName, ImportFromStatement, ImportModulesStatement, find_imports, parse_module
+from starkiller.cache import DEFAULT_STORE_NAME
+from starkiller.models import EditRange
+from starkiller.parsing import (
+    ImportedName,
+    ImportFromStatement,
+    ImportModulesStatement,
+    SourceAnalysis,
+    find_imports,
+)
 from starkiller.project import StarkillerProject
-from starkiller.refactoring import rename, strip_base_name
+from starkiller.pylsp_plugin.jobs import BackgroundJobs, check_cancelled
+from starkiller.refactoring import rename, replace_star_imports, strip_base_name
+from starkiller.stats import collect_stats, timer
+from starkiller.utils import default_cache_dir, iter_python_files
 
 log = logging.getLogger(__name__)
 converter = get_converter()
@@ -33,11 +53,184 @@ DEFAULT_ALIASES = {
     "statsmodels": "sm",
 }
 
+MAX_CACHED_ANALYSES = 16
+
+REPLACE_STAR_IMPORTS_IN_WORKSPACE = "starkiller.replaceStarImportsInWorkspace"
+
+# Names of workspace wide background jobs
+_REPLACE_JOB = "replace"
+_PREWARM_JOB = "prewarm"
+
 
 @dataclasses.dataclass
 class PluginSettings:
     enabled: bool = False
     aliases: dict[str, str] = dataclasses.field(default_factory=lambda: DEFAULT_ALIASES)
+    persistent_cache: bool = False
+    # Threads and processes to parse star imported modules concurrently with, 0 to parse them one by one
+    workers: int = 0
+    # Directory to dump a cProfile stats file of every code actions request to
+    profile_dir: str | None = None
+    # Seconds to wait for code actions computed in background, slower ones are returned by later requests
+    code_actions_timeout: float = 0.5
+    # Number of most often star imported modules to parse in background at startup, 0 to disable
+    prewarm_modules: int = 20
+
+
+@dataclasses.dataclass(frozen=True)
+class _ProjectKey:
+    root: pathlib.Path
+    env_path: pathlib.Path | None
+
+
+@dataclasses.dataclass
+class _ProjectEntry:
+    project: StarkillerProject
+    env_stamp: float | None
+    # Requests and jobs using the project, a dropped project is only closed once they are done
+    users: int = 0
+    dropped: bool = False
+
+
+# Long-lived projects shared across requests, one per workspace root and virtual environment
+_projects: dict[_ProjectKey, _ProjectEntry] = {}
+# Projects are used by request handlers and background jobs
+_projects_lock = threading.Lock()
+# Number of times projects of each workspace root were dropped, to tell whether a project being created is outdated
+_projects_drops: Counter[pathlib.Path] = Counter()
+
+
+def _env_stamp(env_path: pathlib.Path | None) -> float | None:
+    # Recreating or upgrading a venv rewrites its pyvenv.cfg
+    if env_path is None:
+        return None
+    try:
+        return (env_path / "pyvenv.cfg").stat().st_mtime
+    except OSError:
+        return None
+
+
+@contextlib.contextmanager
+def use_project(workspace: Workspace) -> Generator[StarkillerProject]:
+    entry = _acquire_project(workspace)
+    try:
+        yield entry.project
+    finally:
+        _release_projects([entry])
+
+
+def _acquire_project(workspace: Workspace) -> _ProjectEntry:
+    project_path = pathlib.Path(workspace.root_path).resolve()
+    env_path = project_path / ".venv"
+    key = _ProjectKey(project_path, env_path if env_path.exists() else None)
+
+    env_stamp = _env_stamp(key.env_path)
+    while True:
+        with _projects_lock:
+            entry = _projects.get(key)
+            if entry is not None and entry.env_stamp == env_stamp:
+                entry.users += 1
+                return entry
+            drops = _projects_drops[key.root]
+
+        # Creating a project starts a Jedi environment, so it is done without blocking requests to other projects
+        new_entry = _ProjectEntry(_create_project(workspace, key), env_stamp, users=1)
+
+        with _projects_lock:
+            entry = _projects.get(key)
+            # Another request may have created the project first, or settings changed and it is already outdated
+            registered = _projects_drops[key.root] == drops and (entry is None or entry.env_stamp != env_stamp)
+            if registered:
+                unused = _mark_dropped([entry]) if entry is not None else []
+                _projects[key] = new_entry
+
+        if not registered:
+            new_entry.project.close()
+            continue
+        for dropped in unused:
+            dropped.project.close()
+        return new_entry
+
+
+def _create_project(workspace: Workspace, key: _ProjectKey) -> StarkillerProject:
+    log.debug("Creating Starkiller project for %s", key.root)
+    plugin_settings = workspace._config.plugin_settings("starkiller")  # noqa: SLF001
+    persistent_cache = None
+    if plugin_settings.get("persistent_cache"):
+        persistent_cache = default_cache_dir() / DEFAULT_STORE_NAME
+    return StarkillerProject(
+        key.root,
+        env_path=key.env_path,
+        persistent_cache=persistent_cache,
+        workers=plugin_settings.get("workers", 0),
+    )
+
+
+def _release_projects(entries: list[_ProjectEntry]) -> None:
+    with _projects_lock:
+        for entry in entries:
+            entry.users -= 1
+        unused = [entry for entry in entries if entry.dropped and not entry.users]
+    for entry in unused:
+        entry.project.close()
+
+
+def _mark_dropped(entries: list[_ProjectEntry]) -> list[_ProjectEntry]:
+    # Called with the lock held on entries removed from the registry. Closing a project breaks lookups running in it,
+    # so projects in use are closed by their last user. Unused ones are returned to be closed once the lock is released.
+    for entry in entries:
+        entry.dropped = True
+    return [entry for entry in entries if not entry.users]
+
+
+_profile_ids = itertools.count()
+
+
+def _dump_profile(profiler: cProfile.Profile, profile_dir: str) -> None:
+    directory = pathlib.Path(profile_dir).expanduser()
+    profile_path = directory / f"starkiller-{time.strftime('%Y%m%d-%H%M%S')}-{next(_profile_ids)}.prof"
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(profile_path)
+    except OSError as err:
+        log.warning("Can't save profile to %s: %s", profile_path, err)
+    else:
+        log.info("Saved code actions profile to %s", profile_path)
+
+
+# Recently analysed documents by URI, with the document version they were built for
+_analyses: OrderedDict[str, tuple[int | None, SourceAnalysis]] = OrderedDict()
+
+
+def get_analysis(document: Document) -> SourceAnalysis:
+    cached = _analyses.get(document.uri)
+    previous = None
+    if cached is not None:
+        version, previous = cached
+        # Documents without version are compared by content
+        if (version is not None and version == document.version) or previous.source == document.source:
+            _analyses.move_to_end(document.uri)
+            return previous
+
+    # Parse incrementally, reusing the tree of the previous version
+    analysis = SourceAnalysis(document.source, previous=previous, diff_cache_key=f"starkiller:{document.uri}")
+    _analyses[document.uri] = (document.version, analysis)
+    _analyses.move_to_end(document.uri)
+    while len(_analyses) > MAX_CACHED_ANALYSES:
+        _analyses.popitem(last=False)
+    return analysis
+
+
+def drop_projects(workspace: Workspace) -> None:
+    project_path = pathlib.Path(workspace.root_path).resolve()
+    with _projects_lock:
+        _projects_drops[project_path] += 1
+        unused = _mark_dropped([_projects.pop(key) for key in [key for key in _projects if key.root == project_path]])
+    for entry in unused:
+        entry.project.close()
+
+
+_jobs = BackgroundJobs(max_documents=MAX_CACHED_ANALYSES)
 
 
 @hookimpl
@@ -45,6 +238,97 @@ def pylsp_settings() -> dict[str, Any]:
     return dataclasses.asdict(PluginSettings())
 
 
+@hookimpl
+def pylsp_commands() -> list[str]:
+    return [REPLACE_STAR_IMPORTS_IN_WORKSPACE]
+
+
+@hookimpl
+def pylsp_execute_command(workspace: Workspace, command: str, arguments: list[Any]) -> None:  # noqa: ARG001
+    if command != REPLACE_STAR_IMPORTS_IN_WORKSPACE:
+        return
+
+    # The edit is sent to the client once computed, the command itself returns right away
+    _jobs.run_in_workspace(_REPLACE_JOB, lambda: replace_star_imports_in_workspace(workspace))
+
+
+def replace_star_imports_in_workspace(workspace: Workspace) -> None:
+    with use_project(workspace) as project, collect_stats() as stats:
+        changes = get_workspace_changes_replace_star_imports(workspace, project)
+    log.debug("Workspace star imports replaced in %d files: %s", len(changes), stats.format())
+    if changes:
+        workspace.apply_edit(converter.unstructure(WorkspaceEdit(changes=changes)))
+
+
+def prewarm_project(workspace: Workspace, limit: int) -> None:
+    # Parse modules star imported most often in the project, so that first code actions don't have to
+    with use_project(workspace) as project, collect_stats() as stats:
+        star_imports = project.count_star_imports([workspace.root_path])
+        for module_name, _ in star_imports.most_common(limit):
+            check_cancelled()
+            project.warm_up(module_name)
+    log.debug("Pre-warmed Starkiller project for %s: %s", workspace.root_path, stats.format())
+
+
+# Plugin settings projects of each workspace root were last set up with
+_applied_settings: dict[str, dict[str, Any]] = {}
+
+
+def _apply_settings(config: Config, workspace: Workspace) -> None:
+    # Many clients send the configuration right after initialization, projects only need to be rebuilt on changes
+    if not workspace.root_path:
+        return
+    plugin_settings = config.plugin_settings("starkiller")
+    if _applied_settings.get(workspace.root_path) == plugin_settings:
+        return
+    _applied_settings[workspace.root_path] = plugin_settings
+    drop_projects(workspace)
+
+    limit = plugin_settings.get("prewarm_modules", 0)
+    if limit > 0:
+        _jobs.run_in_workspace(_PREWARM_JOB, lambda: prewarm_project(workspace, limit))
+
+
+@hookimpl
+def pylsp_initialize(config: Config, workspace: Workspace) -> None:
+    _apply_settings(config, workspace)
+
+
+@hookimpl
+def pylsp_workspace_configuration_changed(config: Config, workspace: Workspace) -> None:
+    # The plugin is disabled by default and may only be enabled here, after initialization
+    _apply_settings(config, workspace)
+
+
+@hookimpl
+def pylsp_document_did_save(workspace: Workspace, document: Document) -> None:
+    # Changes made by other tools are noticed by polling, saves can be applied right away
+    project_path = pathlib.Path(workspace.root_path).resolve()
+    with _projects_lock:
+        entries = [entry for key, entry in _projects.items() if key.root == project_path]
+        for entry in entries:
+            entry.users += 1
+    try:
+        for entry in entries:
+            affected = entry.project.invalidate([pathlib.Path(document.path)])
+            log.debug("Invalidated modules after saving %s: %s", document.path, ", ".join(sorted(affected)))
+    finally:
+        _release_projects(entries)
+
+
+@hookimpl
+def pylsp_lint(document: Document) -> list[dict[str, Any]]:
+    # Document changes are not passed to plugins, but every change is linted: code actions computed for the previous
+    # versions are outdated now
+    _jobs.cancel_outdated(document.uri, document.version)
+    return []
+
+
+@hookimpl
+def pylsp_shutdown() -> None:
+    _jobs.shutdown()
+
+
 @hookimpl
 def pylsp_code_actions(
     config: Config,
@@ -53,24 +337,80 @@ def pylsp_code_actions(
     range: dict[str, Any],  # noqa: A002
     context: dict[str, Any],  # noqa: ARG001
 ) -> list[dict[str, Any]]:
-    code_actions: list[CodeAction] = []
-    project_path = pathlib.Path(workspace.root_path).resolve()
-    env_path = project_path / ".venv"
-    project = StarkillerProject(
-        project_path,
-        env_path=env_path if env_path.exists() else None,
-    )
-
     config = workspace._config  # noqa: SLF001
     plugin_settings = config.plugin_settings("starkiller", document_path=document.path)
-    aliases = plugin_settings.get("aliases", [])
-
     active_range = converter.structure(range, Range)
     line_no = active_range.start.line + 1
 
-    import_statement = find_imports(document.source, line_no)
+    # The document may change while actions are computed, so they are computed for its current source
+    analysis = get_analysis(document)
+    future = _jobs.get_code_actions(
+        document.uri,
+        document.version,
+        line_no,
+        lambda: compute_code_actions(workspace, document, analysis, line_no, plugin_settings),
+    )
+    try:
+        return future.result(timeout=plugin_settings.get("code_actions_timeout", 0.5))
+    except TimeoutError:
+        log.debug("Code actions for %s:%d are still being computed", document.uri, line_no)
+    except CancelledError:
+        log.debug("Code actions for %s:%d were cancelled", document.uri, line_no)
+    except Exception:
+        # Other plugins' actions are dropped as well if a hook raises
+        log.exception("Code actions for %s:%d failed", document.uri, line_no)
+    return []
+
+
+def compute_code_actions(
+    workspace: Workspace,
+    document: Document,
+    analysis: SourceAnalysis,
+    line_no: int,
+    plugin_settings: dict[str, Any],
+) -> list[dict[str, Any]]:
+    profile_dir = plugin_settings.get("profile_dir")
+    start = time.perf_counter()
+    with use_project(workspace) as project, collect_stats() as stats:
+        if profile_dir:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(get_code_actions, project, document, analysis, line_no, plugin_settings)
+            _dump_profile(profiler, profile_dir)
+        else:
+            result = get_code_actions(project, document, analysis, line_no, plugin_settings)
+
+    log.debug(
+        "Code actions for %s:%d took %.1fms: %s",
+        document.uri,
+        line_no,
+        (time.perf_counter() - start) * 1000,
+        stats.format(),
+    )
+    return result
+
+
+def get_code_actions(
+    project: StarkillerProject,
+    document: Document,
+    analysis: SourceAnalysis,
+    line_no: int,
+    plugin_settings: dict[str, Any],
+) -> list[dict[str, Any]]:
+    code_actions: list[CodeAction] = []
+    aliases = plugin_settings.get("aliases", [])
+
+    with timer("find_imports"):
+        import_statement = find_imports(analysis.parso_tree, line_no)
     if import_statement is None:
         return []
+
+    # Parso recovers from syntax errors, but names of unfinished code can't be scanned
+    try:
+        _ = analysis.ast_tree
+    except SyntaxError as err:
+        log.debug("Can't analyse %s: %s", document.uri, err)
+        return []
+
     import_range = Range(
         start=Position(
             line=import_statement.import_range.start.line - 1,
@@ -85,38 +425,67 @@ def pylsp_code_actions(
     if isinstance(import_statement, ImportFromStatement):
         if import_statement.is_star:
             code_actions.extend(
-                get_ca_for_star_import(document, project, import_statement.module, import_range, aliases)
+                get_ca_for_star_import(document, analysis, project, import_statement.module, import_range, aliases)
             )
-        else:
+            # Replacing all star imports of the file is costly, so it is only offered from star imports
+            code_actions.extend(get_ca_for_all_star_imports(document, project, analysis))
+        elif not import_statement.module.startswith("."):
+            # Relative imports can't be replaced with module imports
             imported_names = import_statement.names or set()
             code_actions.extend(
-                get_ca_for_from_import(document, import_statement.module, imported_names, import_range, aliases)
+                get_ca_for_from_import(
+                    document,
+                    analysis,
+                    import_statement.module,
+                    imported_names,
+                    import_range,
+                    aliases,
+                )
             )
     elif isinstance(import_statement, ImportModulesStatement):
-        code_actions.extend(get_ca_for_module_import(document, import_statement.modules, import_range))
+        code_actions.extend(get_ca_for_module_import(document, analysis, import_statement.modules, import_range))
 
     result: list[dict[str, Any]] = converter.unstructure(code_actions)
     return result
 
 
-def get_ca_for_star_import(
+def get_ca_for_star_import(  # noqa: PLR0913, PLR0917
     document: Document,
+    analysis: SourceAnalysis,
     project: StarkillerProject,
     from_module: str,
     import_range: Range,
     aliases: dict[str, Any],
 ) -> list[CodeAction]:
-    undefined_names = parse_module(document.source, check_internal_scopes=True).undefined
+    with timer("scan_names"):
+        undefined_names = analysis.names.undefined
     if not undefined_names:
-        return [get_ca_remove_unnecessary_import(document, import_range)]
+        return [get_ca_remove_unnecessary_import(document, analysis, import_range)]
 
-    externaly_defined = project.find_definitions(from_module, set(undefined_names))
+    absolute_module = project.resolve_import(from_module, document.path)
+    if absolute_module is None:
+        return []
+
+    check_cancelled()
+    with timer("find_definitions"):
+        externaly_defined = find_star_imported_names(project, absolute_module, set(undefined_names))
+    if externaly_defined is None:
+        return []
     if not externaly_defined:
-        return [get_ca_remove_unnecessary_import(document, import_range)]
+        return [get_ca_remove_unnecessary_import(document, analysis, import_range)]
+
+    replace_with_names = CodeAction(
+        title="Starkiller: Replace * with explicit names",
+        kind=CodeActionKind.SourceOrganizeImports,
+        edit=WorkspaceEdit(
+            changes={document.uri: get_edits_replace_module_w_from(from_module, externaly_defined, import_range)},
+        ),
+    )
+    if from_module.startswith("."):
+        return [replace_with_names]
 
-    text_edits_from = get_edits_replace_module_w_from(from_module, externaly_defined, import_range)
     text_edits_module = get_edits_replace_from_w_module(
-        document.source,
+        analysis,
         from_module,
         {ImportedName(name) for name in externaly_defined},
         import_range,
@@ -124,11 +493,7 @@ def get_ca_for_star_import(
     )
 
     return [
-        CodeAction(
-            title="Starkiller: Replace * with explicit names",
-            kind=CodeActionKind.SourceOrganizeImports,
-            edit=WorkspaceEdit(changes={document.uri: text_edits_from}),
-        ),
+        replace_with_names,
         CodeAction(
             title="Starkiller: Replace * import with module import",
             kind=CodeActionKind.SourceOrganizeImports,
@@ -137,12 +502,92 @@ def get_ca_for_star_import(
     ]
 
 
+def find_star_imported_names(project: StarkillerProject, module_name: str, names: set[str]) -> set[str] | None:
+    # Names provided by modules that can't be found or parsed are unknown, so their imports are left as is
+    try:
+        report = project.explain_definitions(module_name, names)
+    except (OSError, UnicodeDecodeError, SyntaxError) as err:
+        log.debug("Can't resolve star import of %s: %s", module_name, err)
+        return None
+    if module_name in report.unresolved:
+        return None
+    return report.found
+
+
+def get_ca_for_all_star_imports(
+    document: Document,
+    project: StarkillerProject,
+    analysis: SourceAnalysis,
+) -> list[CodeAction]:
+    code_actions = [
+        CodeAction(
+            title="Starkiller: Replace * with explicit names in workspace",
+            kind=CodeActionKind.Source,
+            command=Command(
+                title="Replace * with explicit names in workspace",
+                command=REPLACE_STAR_IMPORTS_IN_WORKSPACE,
+            ),
+        ),
+    ]
+
+    check_cancelled()
+    with timer("edits"):
+        text_edits = list(itertools.starmap(to_text_edit, replace_star_imports(analysis, project, document.path)))
+    if text_edits:
+        code_actions.insert(
+            0,
+            CodeAction(
+                title="Starkiller: Replace * with explicit names in file",
+                kind=CodeActionKind.SourceFixAll,
+                edit=WorkspaceEdit(changes={document.uri: text_edits}),
+            ),
+        )
+    return code_actions
+
+
+def get_workspace_changes_replace_star_imports(
+    workspace: Workspace,
+    project: StarkillerProject,
+) -> dict[str, list[TextEdit]]:
+    changes: dict[str, list[TextEdit]] = {}
+    for path in iter_python_files([pathlib.Path(workspace.root_path)]):
+        # Star imports of package init modules usually re-export names rather than use them
+        if path.name == "__init__.py":
+            continue
+
+        check_cancelled()
+
+        # Open documents may have unsaved changes
+        uri = uris.from_fs_path(str(path))
+        document = workspace.get_maybe_document(uri)
+        try:
+            source = document.source if document is not None else path.read_text("utf-8")
+            analysis = SourceAnalysis(source)
+            text_edits = list(itertools.starmap(to_text_edit, replace_star_imports(analysis, project, path)))
+        except (OSError, UnicodeDecodeError, SyntaxError) as err:
+            log.debug("Skipping %s: %s", path, err)
+            continue
+        if text_edits:
+            changes[uri] = text_edits
+    return changes
+
+
+def to_text_edit(edit_range: EditRange, new_text: str) -> TextEdit:
+    text_range = Range(
+        start=Position(line=edit_range.start.line, character=edit_range.start.char),
+        end=Position(line=edit_range.end.line, character=edit_range.end.char),
+    )
+    return TextEdit(range=text_range, new_text=new_text)
+
+
 def get_ca_for_module_import(
     document: Document,
+    analysis: SourceAnalysis,
     imported_modules: set[ImportedName],
     import_range: Range,
 ) -> list[CodeAction]:
-    parsed = parse_module(document.source, check_internal_scopes=True, collect_imported_attrs=True)
+    with timer("scan_names"):
+        parsed = analysis.names
 
     if len(imported_modules) != 1:
         # If there is a comma separated list, it probably must be splitted first
@@ -152,16 +597,13 @@ def get_ca_for_module_import(
     module = imported_modules.pop()
     used_attrs = parsed.attr_usages.get(module.alias or module.name)
     if not used_attrs:
-        return [get_ca_remove_unnecessary_import(document, import_range)]
+        return [get_ca_remove_unnecessary_import(document, analysis, import_range)]
 
     text_edits = get_edits_replace_module_w_from(module.name, used_attrs, import_range)
 
-    for edit_range, new_value in strip_base_name(document.source, module.alias or module.name, used_attrs):
-        rename_range = Range(
-            start=Position(line=edit_range.start.line, character=edit_range.start.char),
-            end=Position(line=edit_range.end.line, character=edit_range.end.char),
-        )
-        text_edits.append(TextEdit(range=rename_range, new_text=new_value))
+    with timer("edits"):
+        for edit_range, new_value in strip_base_name(analysis.parso_tree, module.alias or module.name, used_attrs):
+            text_edits.append(to_text_edit(edit_range, new_value))
 
     return [
         CodeAction(
@@ -172,14 +614,15 @@ def get_ca_for_module_import(
     ]
 
 
-def get_ca_for_from_import(
+def get_ca_for_from_import(  # noqa: PLR0913, PLR0917
     document: Document,
+    analysis: SourceAnalysis,
     from_module: str,
     imported_names: set[ImportedName],
     import_range: Range,
     aliases: dict[str, Any],
 ) -> list[CodeAction]:
-    text_edits = get_edits_replace_from_w_module(document.source, from_module, imported_names, import_range, aliases)
+    text_edits = get_edits_replace_from_w_module(analysis, from_module, imported_names, import_range, aliases)
     return [
         CodeAction(
             title="Starkiller: Replace from import with module import",
@@ -196,7 +639,7 @@ def get_edits_replace_module_w_from(from_module: str, names: set[str], import_ra
 
 
 def get_edits_replace_from_w_module(
-    source: str,
+    analysis: SourceAnalysis,
     from_module: str,
     names: set[ImportedName],
     import_range: Range,
@@ -209,20 +652,18 @@ def get_edits_replace_from_w_module(
     text_edits = [TextEdit(range=import_range, new_text=new_text)]
 
     rename_map = {n.alias or n.name: f"{from_module}.{n.name}" for n in names}
-    for edit_range, new_value in rename(source, rename_map):
-        rename_range = Range(
-            start=Position(line=edit_range.start.line, character=edit_range.start.char),
-            end=Position(line=edit_range.end.line, character=edit_range.end.char),
-        )
-        text_edits.append(TextEdit(range=rename_range, new_text=new_value))
+    with timer("edits"):
+        for edit_range, new_value in rename(analysis.parso_tree, rename_map):
+            text_edits.append(to_text_edit(edit_range, new_value))
     return text_edits
 
 
-def get_ca_remove_unnecessary_import(document: Document, import_range: Range) -> CodeAction:
+def get_ca_remove_unnecessary_import(document: Document, analysis: SourceAnalysis, import_range: Range) -> CodeAction:
     import_line_num = import_range.start.line
-    import_line = document.lines[import_line_num]
+    lines = analysis.source.splitlines(keepends=True)
+    import_line = lines[import_line_num]
 
-    if import_line != len(document.lines) - 1:
+    if import_line != len(lines) - 1:
         end = Position(line=import_line_num + 1, character=0)
     else:
         end = Position(line=import_line_num, character=len(import_line) - 1)
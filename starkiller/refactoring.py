@@ -1,25 +1,29 @@
 """Utilities to change Python code."""
 
-from collections.abc import Generator
+from collections.abc import Generator, Iterable
+from pathlib import Path
 
 import parso
+from parso.python.tree import Module as ParsoModule
 
 from starkiller.models import EditPosition, EditRange
+from starkiller.parsing import SourceAnalysis
+from starkiller.project import StarkillerProject
 
 
-def rename(source: str, rename_map: dict[str, str]) -> Generator[tuple[EditRange, str]]:
+def rename(source: str | ParsoModule, rename_map: dict[str, str]) -> Generator[tuple[EditRange, str]]:
     """Generate rename edits.
 
     Generates source code changes to rename names from rename_map. Doesn't affect imports.
 
     Args:
-        source: Source code being refactored.
+        source: Source code being refactored or its parso tree.
         rename_map: Rename mapping, old name VS new name.
 
     Yields:
         EditRange and edit text.
     """
-    root = parso.parse(source)
+    root = parso.parse(source) if isinstance(source, str) else source
     for old_name, nodes in root.get_used_names().items():
         if old_name in rename_map:
             for node in nodes:
@@ -40,20 +44,20 @@ def rename(source: str, rename_map: dict[str, str]) -> Generator[tuple[EditRange
                 yield (edit_range, rename_map[old_name])
 
 
-def strip_base_name(source: str, base_name: str, attrs: set[str]) -> Generator[tuple[EditRange, str]]:
+def strip_base_name(source: str | ParsoModule, base_name: str, attrs: set[str]) -> Generator[tuple[EditRange, str]]:
     """Generate base name strip edits for attribute calls.
 
     Finds all base_name usages with attributes and generates edits stripping the base_name. Doesn't affect imports.
 
     Args:
-        source: Source code being refactored.
+        source: Source code being refactored or its parso tree.
         base_name: Target name.
         attrs: Attributes to be converted.
 
     Yields:
         EditRange and edit text.
     """
-    root = parso.parse(source)
+    root = parso.parse(source) if isinstance(source, str) else source
     nodes = root.get_used_names().get(base_name, [])
     for node in nodes:
         operator_leaf = node.get_next_leaf()
@@ -75,3 +79,76 @@ def strip_base_name(source: str, base_name: str, attrs: set[str]) -> Generator[t
         )
 
         yield (edit_range, "")
+
+
+def replace_star_imports(
+    source: str | SourceAnalysis,
+    project: StarkillerProject,
+    path: Path | str | None = None,
+) -> Generator[tuple[EditRange, str]]:
+    """Generate edits replacing all star imports with explicit names.
+
+    Star imports providing no used names are removed. If several star imports provide the same name, it is attributed
+    to the last one, like at runtime.
+
+    Args:
+        source: Source code being refactored or its analysis.
+        project: Project to look for imported definitions in.
+        path: Optional path to the source file, required to resolve relative imports.
+
+    Yields:
+        EditRange and edit text.
+    """
+    analysis = SourceAnalysis(source) if isinstance(source, str) else source
+    lines = parso.split_lines(analysis.source)
+    for statement, found_names in project.resolve_star_imports(analysis, path):
+        if found_names:
+            new_text = f"from {statement.module} import {', '.join(sorted(found_names))}"
+            yield (_to_edit_range(statement.import_range), new_text)
+        else:
+            yield (_get_line_removal_range(statement.import_range, lines), "")
+
+
+def apply_edits(source: str, edits: Iterable[tuple[EditRange, str]]) -> str:
+    """Apply edits to source code.
+
+    Args:
+        source: Source code being refactored.
+        edits: Non-overlapping EditRange and edit text pairs, as generated by this module.
+
+    Returns:
+        Changed source code.
+    """
+    lines = parso.split_lines(source, keepends=True)
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    result = source
+    for edit_range, new_text in sorted(edits, key=lambda e: (e[0].start.line, e[0].start.char), reverse=True):
+        start = line_offsets[edit_range.start.line] + edit_range.start.char
+        end = line_offsets[edit_range.end.line] + edit_range.end.char
+        result = result[:start] + new_text + result[end:]
+    return result
+
+
+def _to_edit_range(import_range: EditRange) -> EditRange:
+    # Import ranges use parso line numbers, starting from 1
+    return EditRange(
+        start=EditPosition(line=import_range.start.line - 1, char=import_range.start.char),
+        end=EditPosition(line=import_range.end.line - 1, char=import_range.end.char),
+    )
+
+
+def _get_line_removal_range(import_range: EditRange, lines: list[str]) -> EditRange:
+    edit_range = _to_edit_range(import_range)
+    if edit_range.end.line + 1 < len(lines):
+        # Remove the whole line, including the line break
+        return EditRange(
+            start=EditPosition(line=edit_range.start.line, char=0),
+            end=EditPosition(line=edit_range.end.line + 1, char=0),
+        )
+    return EditRange(
+        start=EditPosition(line=edit_range.start.line, char=0),
+        end=EditPosition(line=edit_range.end.line, char=len(lines[edit_range.end.line])),
+    )
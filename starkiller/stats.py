@@ -0,0 +1,106 @@
+"""Lightweight timers and counters of hot paths.
+
+Statistics are only collected inside a `collect_stats` block, elsewhere `timer` and `count` do next to nothing. The
+collector is kept in a context variable, so concurrent requests in different threads don't mix their numbers. Worker
+threads of a single request may share its collector, so updates are locked.
+"""
+
+import threading
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Stats:
+    """Collected statistics.
+
+    Attributes:
+        timers: Total time spent in each stage, in seconds.
+        counters: Event counts, e.g. cache hits or parsed modules.
+    """
+
+    timers: dict[str, float] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Add time to a stage timer.
+
+        Args:
+            name: Stage name.
+            seconds: Time spent in the stage.
+        """
+        with self._lock:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def add_count(self, name: str, value: int = 1) -> None:
+        """Increase an event counter.
+
+        Args:
+            name: Counter name.
+            value: Number of events.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def format(self) -> str:
+        """Format statistics for logging.
+
+        Returns:
+            One line summary.
+        """
+        timers = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.timers.items())
+        counters = ", ".join(f"{name}={value}" for name, value in self.counters.items())
+        return "; ".join(part for part in (timers, counters) if part) or "nothing recorded"
+
+
+_current_stats: ContextVar[Stats | None] = ContextVar("starkiller_stats", default=None)
+
+
+@contextmanager
+def collect_stats() -> Generator[Stats]:
+    """Collect statistics of the code run inside the block.
+
+    Yields:
+        Stats object filled as the block runs.
+    """
+    stats = Stats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def timer(name: str) -> Generator[None]:
+    """Add time spent inside the block to a stage timer.
+
+    Args:
+        name: Stage name.
+    """
+    stats = _current_stats.get()
+    if stats is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_time(name, time.perf_counter() - start)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Increase an event counter.
+
+    Args:
+        name: Counter name.
+        value: Number of events.
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.add_count(name, value)
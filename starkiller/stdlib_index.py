@@ -0,0 +1,125 @@
+"""Index of names exported by standard library modules."""
+
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+# Bump on any change of the index file format or of the way exports are collected
+INDEX_FORMAT_VERSION = 2
+
+
+def get_index_file_name(python_version: tuple[int, ...], jedi_version: str, stdlib_dirs: Iterable[Path]) -> str:
+    """Get name of the index file for a Python installation and Jedi version.
+
+    Standard library modules and typeshed stubs shipped with Jedi only change with these, so indexes of different
+    installations and versions are kept in separate files. Virtual environments share the index of their base
+    installation.
+
+    Args:
+        python_version: Version of the project Python interpreter.
+        jedi_version: Version of Jedi.
+        stdlib_dirs: Standard library directories of the interpreter.
+
+    Returns:
+        File name.
+    """
+    major, minor = python_version[:2]
+    installation = hashlib.sha256("\n".join(sorted(map(str, stdlib_dirs))).encode()).hexdigest()[:12]
+    return f"stdlib-exports-py{major}.{minor}-jedi{jedi_version}-{installation}.json"
+
+
+class StdlibExportsIndex:
+    """Names provided by star imports of standard library modules.
+
+    Exports of each module are collected once and then looked up in memory. If a file path is given, the index is
+    loaded from it and saved on every update, so it is shared between sessions and processes. File errors are logged
+    and otherwise ignored: the index is an optimisation only. The index is thread safe.
+    """
+
+    def __init__(self, index_path: Path | str | None = None) -> None:
+        """Inits index, loading it from the file if it exists.
+
+        Args:
+            index_path: Optional path to the index file.
+        """
+        self.index_path = None if index_path is None else Path(index_path)
+        self._exports: dict[str, frozenset[str]] = self._load()
+        self._lock = threading.Lock()
+
+    def get(self, module_name: str) -> frozenset[str] | None:
+        """Get names exported by a module.
+
+        Args:
+            module_name: Full name of the module, e.g. `"os"`.
+
+        Returns:
+            Set of exported names or None if the module wasn't indexed yet.
+        """
+        return self._exports.get(module_name)
+
+    def add(self, module_name: str, exports: frozenset[str]) -> None:
+        """Add names exported by a module to the index.
+
+        Args:
+            module_name: Full name of the module.
+            exports: Names provided by a star import of the module.
+        """
+        with self._lock:
+            self._exports[module_name] = exports
+            self._save()
+
+    def discard(self, module_names: Iterable[str]) -> None:
+        """Remove modules from the index, e.g. once their files were changed.
+
+        Args:
+            module_names: Full names of the modules, missing ones are ignored.
+        """
+        with self._lock:
+            removed = [self._exports.pop(module_name, None) for module_name in module_names]
+            if any(exports is not None for exports in removed):
+                self._save()
+
+    def _load(self) -> dict[str, frozenset[str]]:
+        if self.index_path is None:
+            return {}
+        try:
+            data: dict[str, Any] = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as err:
+            log.warning("Can't read stdlib index %s: %s", self.index_path, err)
+            return {}
+
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            return {}
+        return {module_name: frozenset(names) for module_name, names in data["modules"].items()}
+
+    def _save(self) -> None:
+        if self.index_path is None:
+            return
+
+        data = {
+            "version": INDEX_FORMAT_VERSION,
+            "modules": {module_name: sorted(names) for module_name, names in sorted(self._exports.items())},
+        }
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            # Replace the file atomically, other processes may be reading it
+            with tempfile.NamedTemporaryFile(
+                "w",
+                encoding="utf-8",
+                dir=self.index_path.parent,
+                prefix=self.index_path.name,
+                delete=False,
+            ) as tmp_file:
+                json.dump(data, tmp_file, separators=(",", ":"))
+            Path(tmp_file.name).replace(self.index_path)
+        except OSError as err:
+            log.warning("Can't save stdlib index to %s: %s", self.index_path, err)
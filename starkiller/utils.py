@@ -2,20 +2,121 @@
 
 import builtins
 import inspect
+import logging
+import os
 import pathlib
+import subprocess  # noqa: S404
 import sys
 import warnings
+from collections.abc import Generator, Iterable
+from functools import cache
 
-import jedi  # type: ignore
+from starkiller.stats import count
+
+log = logging.getLogger(__name__)
 
-BUILTIN_FUNCTIONS = set(dir(builtins))
 BUILTIN_MODULES = sys.builtin_module_names
+SKIP_DIRS = frozenset({".git", ".hg", ".tox", ".nox", ".venv", "venv", "__pycache__", "build", "dist"})
+
+# Prints standard library directories of the interpreter it is run with, extension modules included
+_STDLIB_DIRS_SCRIPT = """
+import os, sys, sysconfig
+# In a virtual environment platstdlib is inside the environment, next to site-packages
+base_vars = {"base": sys.base_prefix, "platbase": sys.base_exec_prefix}
+stdlib_dirs = {sysconfig.get_path("stdlib", vars=base_vars), sysconfig.get_path("platstdlib", vars=base_vars)}
+for stdlib_dir in [*stdlib_dirs]:
+    stdlib_dirs.add(os.path.join(stdlib_dir, "lib-dynload"))
+stdlib_dirs.add(os.path.join(sys.base_prefix, "DLLs"))
+print("\\n".join(path for path in stdlib_dirs if os.path.isdir(path)))
+"""
+_STDLIB_DIRS_TIMEOUT = 10
+
+
+@cache
+def get_builtin_names() -> frozenset[str]:
+    """Get names available in every module without import."""
+    return frozenset(dir(builtins))
+
+
+@cache
+def get_jedi_dir() -> pathlib.Path:
+    """Get Jedi package directory."""
+    # Jedi is slow to import and only needed once a project is created
+    import jedi  # type: ignore  # noqa: PLC0415
+
+    return pathlib.Path(inspect.getfile(jedi)).resolve().parent
+
+
+@cache
+def get_stub_stdlib_subdirs() -> tuple[pathlib.Path, ...]:
+    """Get directories of stdlib stub packages shipped with Jedi.
+
+    Python 2 only stubs are skipped. The rest are ordered from the newest Python version to the oldest, so that version
+    specific stubs take precedence over the ones shared with older versions, e.g. `3.7`, `3`, `2and3`.
+    """
+    stub_stdlib_dir = get_jedi_dir() / "third_party/typeshed/stdlib"
+    if not stub_stdlib_dir.is_dir():
+        warnings.warn("Can't find stdlib stub files. Check Jedi installation.", RuntimeWarning, stacklevel=1)
+        return ()
+    subdirs = [path for path in stub_stdlib_dir.iterdir() if path.is_dir() and path.name != "2"]
+    return tuple(sorted(subdirs, key=_get_stub_dir_version, reverse=True))
+
+
+def _get_stub_dir_version(path: pathlib.Path) -> tuple[int, ...]:
+    # Minimal Python version of a stubs directory, e.g. (3, 7) for `3.7` and (2,) for `2and3`
+    return tuple(int(part) for part in path.name.partition("and")[0].split(".") if part.isdigit())
+
+
+@cache
+def get_stdlib_dirs(executable: str) -> tuple[pathlib.Path, ...]:
+    """Get standard library directories of a Python interpreter.
+
+    Other directories on the interpreter path, e.g. installed packages or `PYTHONPATH` entries, are not included.
+
+    Args:
+        executable: Path to the interpreter executable.
+
+    Returns:
+        Directories of standard library modules, empty if the interpreter can't be run.
+    """
+    try:
+        result = subprocess.run(  # noqa: S603
+            [executable, "-I", "-c", _STDLIB_DIRS_SCRIPT],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=_STDLIB_DIRS_TIMEOUT,
+        )
+    except (OSError, subprocess.SubprocessError) as err:
+        log.warning("Can't get standard library directories of %s: %s", executable, err)
+        return ()
+    return tuple(sorted(pathlib.Path(line) for line in result.stdout.splitlines() if line))
+
+
+def default_cache_dir() -> pathlib.Path:
+    """Get the user cache directory for Starkiller data."""
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    base_dir = pathlib.Path(cache_home) if cache_home else pathlib.Path.home() / ".cache"
+    return base_dir / "starkiller"
+
+
+def iter_python_files(paths: Iterable[pathlib.Path]) -> Generator[pathlib.Path]:
+    """Find Python files.
+
+    Args:
+        paths: Files and directories to search in. Hidden, build and virtual environment directories are skipped.
 
-JEDI_DIR = pathlib.Path(inspect.getfile(jedi)).resolve().parent
-_stub_stdlib_dir = JEDI_DIR / "third_party/typeshed/stdlib"
-if not _stub_stdlib_dir.is_dir():
-    warnings.warn("Can't find stdlib stub files. Check Jedi installation.", RuntimeWarning, stacklevel=1)
-    STUB_STDLIB_SUBDIRS = []
-else:
-    _stub_stdlib_dir, _stub_stdlib_subdirs, _stub_stdlib_files = next(_stub_stdlib_dir.walk())
-    STUB_STDLIB_SUBDIRS = [_stub_stdlib_dir / sd for sd in _stub_stdlib_subdirs]
+    Yields:
+        Paths to Python files.
+    """
+    for path in paths:
+        if path.is_file():
+            count("files_walked")
+            yield path
+            continue
+        for dirpath, dirnames, filenames in path.walk():
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith("."))
+            for name in sorted(filenames):
+                if name.endswith(".py"):
+                    count("files_walked")
+                    yield dirpath / name
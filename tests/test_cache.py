@@ -0,0 +1,76 @@
+import sqlite3
+from pathlib import Path
+
+from starkiller.cache import ModuleNamesCache, ModuleNamesStore, get_file_stamp
+
+
+def test_module_names_cache(tmp_path: Path) -> None:
+    first = tmp_path / "first.py"
+    first.write_text("a = 1\nb = 2\n")
+    second = tmp_path / "second.py"
+    second.write_text("from first import *\n")
+
+    cache = ModuleNamesCache(maxsize=1)
+    assert cache.parse(first).defined == {"a", "b"}
+    assert cache.parse(first).defined == {"a", "b"}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Changed files are parsed again
+    first.write_text("a = 1\nb = 2\nc = 3\n")
+    assert cache.parse(first).defined == {"a", "b", "c"}
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # Least recently used module is evicted
+    assert set(cache.parse(second).import_map) == {"first"}
+    cache.parse(first)
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_module_names_store(tmp_path: Path) -> None:
+    module = tmp_path / "module.py"
+    module.write_text("import os.path as osp\nfrom .sub import *\nx = osp.join(a, b)\n")
+    db_path = tmp_path / "cache" / "modules.sqlite3"
+
+    cache = ModuleNamesCache(store=ModuleNamesStore(db_path))
+    names = cache.parse(module)
+
+    # A new session reads names from disk
+    store = ModuleNamesStore(db_path)
+    stored_names = store.load(module, get_file_stamp(module))
+    assert stored_names == names
+
+    module.write_text("y = 1\n")
+    assert store.load(module, get_file_stamp(module)) is None
+    store.close()
+
+
+def test_module_names_store_cleanup(tmp_path: Path) -> None:
+    module = tmp_path / "module.py"
+    module.write_text("x = 1\n")
+    deleted = tmp_path / "deleted.py"
+    deleted.write_text("y = 2\n")
+    db_path = tmp_path / "modules.sqlite3"
+
+    cache_store = ModuleNamesStore(db_path)
+    cache = ModuleNamesCache(store=cache_store)
+    cache.parse(module)
+    cache.parse(deleted)
+    store = ModuleNamesStore(db_path)
+
+    # Corrupt entries are dropped and parsed again
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("UPDATE modules SET names = '{\"undefined\": [' WHERE path = ?", (str(module),))
+    assert store.load(module, get_file_stamp(module)) is None
+    assert cache.parse(module).defined == {"x"}
+    cache.evict(module)
+    assert store.load(module, get_file_stamp(module)) is None
+
+    # Entries of deleted files are dropped once the store is opened again
+    stamp = get_file_stamp(deleted)
+    deleted.unlink()
+    store.close()
+    assert store.load(deleted, stamp) is None
+    with sqlite3.connect(db_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM modules").fetchone() == (0,)
+    store.close()
+    cache_store.close()
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import pytest
+
+from starkiller.cli import main
+
+
+def test_cli(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "__init__.py").write_text("from .core import *\n")
+    (package / "core.py").write_text("def alpha():\n    pass\n\ndef beta():\n    pass\n")
+    module = tmp_path / "module.py"
+    module.write_text("from package import *\nfrom time import *\n\nalpha()\n")
+    monkeypatch.chdir(tmp_path)
+
+    assert main(["--no-cache", "-j", "1"]) == 0
+    diff = capsys.readouterr().out
+    assert "+from package import alpha" in diff
+    assert "-from time import *" in diff
+    assert "__init__.py" not in diff
+
+    assert main(["--no-cache", "--write", str(module)]) == 0
+    assert module.read_text() == "from package import alpha\n\nalpha()\n"
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+from starkiller.import_graph import ImportGraph
+from starkiller.models import ImportedName
+from starkiller.project import StarkillerProject
+
+
+def test_import_graph() -> None:
+    graph = ImportGraph()
+    graph.update("app", Path("app.py"), {"lib": {ImportedName("*")}, "os": {ImportedName("path")}})
+    graph.update("cli", Path("cli.py"), {"lib": {ImportedName("run", "start")}})
+    assert set(graph) == {"app", "cli"}
+    assert graph.get_importers("lib") == {"app": {ImportedName("*")}, "cli": {ImportedName("run", "start")}}
+    assert graph.get_star_importers("lib") == {"app"}
+
+    graph.update("app", Path("app.py"), {"os": {ImportedName("path")}})
+    assert graph.get_star_importers("lib") == set()
+    assert set(graph.get_importers("lib")) == {"cli"}
+
+    graph.remove("cli")
+    assert "cli" not in graph
+    assert graph.get_importers("lib") == {}
+    assert graph.get_imports("app") == {"os": {ImportedName("path")}}
+
+
+def test_project_import_graph(tmp_path: Path) -> None:
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "__init__.py").write_text("from .core import *\n")
+    (package / "core.py").write_text("import os\n\ndef alpha():\n    pass\n")
+    module = tmp_path / "module.py"
+    module.write_text("from package import alpha\n")
+    project = StarkillerProject(tmp_path)
+
+    graph = project.get_import_graph()
+    assert set(graph) == {"package", "package.core", "module"}
+    assert graph.get_star_importers("package.core") == {"package"}
+    assert graph.get_importers("package") == {"module": {ImportedName("alpha")}}
+    assert project.get_import_graph() is graph
+
+    # Incremental updates
+    module.write_text("from package.core import *\n")
+    (package / "core.py").unlink()
+    project.update_import_graph([module, package / "core.py", tmp_path.parent / "outside.py"])
+    assert set(graph) == {"package", "module"}
+    assert graph.get_star_importers("package.core") == {"package", "module"}
+    assert graph.get_importers("package") == {}
+
+
+def test_project_invalidate(tmp_path: Path) -> None:
+    (tmp_path / "base.py").write_text("def alpha():\n    pass\n")
+    (tmp_path / "middle.py").write_text("from base import *\n")
+    (tmp_path / "top.py").write_text("from middle import *\n")
+    (tmp_path / "other.py").write_text("from base import alpha\n")
+    project = StarkillerProject(tmp_path)
+    assert project.invalidate([tmp_path / "base.py"]) == {"base"}
+
+    project.get_import_graph()
+    assert project.invalidate([tmp_path / "base.py"]) == {"base", "middle", "top"}
+
+    # New modules are found right away
+    assert project.find_module("created") is None
+    (tmp_path / "created.py").write_text("from top import *\n")
+    assert project.invalidate([tmp_path / "created.py"]) == {"created"}
+    assert project.find_module("created") is not None
+    assert project.get_import_graph().get_star_importers("top") == {"created"}
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections.abc import Generator
+from concurrent.futures import CancelledError, Future
+from typing import Any, NoReturn
+
+import pytest
+
+from starkiller.pylsp_plugin.jobs import BackgroundJobs, check_cancelled
+
+TIMEOUT = 5
+
+
+def _run_until_cancelled(started: threading.Event, stopped: threading.Event) -> NoReturn:
+    # Like a slow lookup checking for cancellation now and then
+    started.set()
+    try:
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+    finally:
+        stopped.set()
+
+
+def _run_until_released(started: threading.Event, released: threading.Event) -> list[dict[str, Any]]:
+    started.set()
+    released.wait(TIMEOUT)
+    return [{"title": "released"}]
+
+
+def _result(future: Future[Any]) -> object:
+    try:
+        return future.result(timeout=TIMEOUT)
+    except CancelledError:
+        return "cancelled"
+
+
+@pytest.fixture
+def jobs() -> Generator[BackgroundJobs]:
+    jobs = BackgroundJobs()
+    yield jobs
+    jobs.shutdown()
+
+
+def test_document_versions(jobs: BackgroundJobs) -> None:
+    started, stopped = threading.Event(), threading.Event()
+    outdated = jobs.get_code_actions("file.py", 1, 1, lambda: _run_until_cancelled(started, stopped))
+    assert started.wait(TIMEOUT)
+
+    # Actions are kept for the document version, a new version stops the running job
+    assert jobs.get_code_actions("file.py", 1, 1, list) is outdated
+    current = jobs.get_code_actions("file.py", 2, 1, lambda: [{"title": "current"}])
+    assert _result(current) == [{"title": "current"}]
+    assert _result(outdated) == "cancelled"
+    assert stopped.is_set()
+    assert jobs.get_code_actions("file.py", 2, 1, list) is current
+
+    # Linting a new version drops actions of the previous one
+    jobs.cancel_outdated("file.py", 3)
+    assert jobs.get_code_actions("file.py", 3, 1, list) is not current
+
+
+def test_cursor_moves(jobs: BackgroundJobs) -> None:
+    started, released = threading.Event(), threading.Event()
+    running = jobs.get_code_actions("file.py", 1, 1, lambda: _run_until_released(started, released))
+    assert started.wait(TIMEOUT)
+
+    # Requests for lines the cursor already left are dropped before they start, the running one is finished
+    pending = jobs.get_code_actions("file.py", 1, 2, lambda: [{"title": "pending"}])
+    latest = jobs.get_code_actions("file.py", 1, 3, lambda: [{"title": "latest"}])
+    assert pending.cancelled()
+    released.set()
+    assert _result(running) == [{"title": "released"}]
+    assert _result(latest) == [{"title": "latest"}]
+
+    # A dropped line is computed again once the cursor is back
+    assert _result(jobs.get_code_actions("file.py", 1, 2, lambda: [{"title": "again"}])) == [{"title": "again"}]
+
+
+def test_workspace_jobs(jobs: BackgroundJobs) -> None:
+    started, stopped = threading.Event(), threading.Event()
+    replaced = jobs.run_in_workspace("replace", lambda: _run_until_cancelled(started, stopped))
+    assert started.wait(TIMEOUT)
+
+    # Jobs of other kinds don't cancel each other, they wait in line
+    other = jobs.run_in_workspace("prewarm", lambda: "prewarm")
+    assert not stopped.is_set()
+
+    # The latest job of a kind stops the previous one
+    latest = jobs.run_in_workspace("replace", lambda: "latest")
+    assert _result(replaced) == "cancelled"
+    assert stopped.is_set()
+    assert _result(other) == "prewarm"
+    assert _result(latest) == "latest"
+
+
+def test_failed_jobs(jobs: BackgroundJobs) -> None:
+    def fail() -> list[dict[str, Any]]:
+        raise RuntimeError
+
+    failed = jobs.get_code_actions("file.py", 1, 1, fail)
+    with pytest.raises(RuntimeError):
+        failed.result(timeout=TIMEOUT)
+
+    # Failures aren't kept for the document version
+    assert _result(jobs.get_code_actions("file.py", 1, 1, lambda: [{"title": "fixed"}])) == [{"title": "fixed"}]
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from starkiller.module_index import ModuleIndex
+
+
+def test_module_index(tmp_path: Path) -> None:
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "__init__.py").touch()
+    (package / "sub.pyi").touch()
+    (package / "sub.py").touch()
+    (tmp_path / "mod.py").touch()
+    (tmp_path / "notes.txt").touch()
+
+    index = ModuleIndex()
+
+    module = index.find("mod", [tmp_path])
+    assert module is not None
+    assert module.path == tmp_path / "mod.py"
+    assert not module.package
+
+    package_module = index.find("pkg", [tmp_path / "missing", tmp_path])
+    assert package_module is not None
+    assert package_module.package
+    assert package_module.submodule_paths == [package]
+
+    submodule = index.find("sub", package_module.submodule_paths or [])
+    assert submodule is not None
+    assert submodule.path == package / "sub.py"
+
+    assert index.find("notes", [tmp_path]) is None
+
+    # Listings are cached until cleared
+    (tmp_path / "new.py").touch()
+    assert index.find("new", [tmp_path]) is None
+    index.clear()
+    assert index.find("new", [tmp_path]) is not None
+
+
+def test_module_index_polling(tmp_path: Path) -> None:
+    index = ModuleIndex(poll_interval=0)
+    assert index.find("new", [tmp_path]) is None
+
+    # Changed directories are listed again
+    (tmp_path / "new.py").touch()
+    assert index.find("new", [tmp_path]) is not None
+
+    # Explicit invalidation works without polling
+    index = ModuleIndex()
+    assert index.find("other", [tmp_path]) is None
+    (tmp_path / "other.py").touch()
+    index.invalidate(tmp_path / "other.py")
+    assert index.find("other", [tmp_path]) is not None
@@ -1,6 +1,12 @@
 import pytest
 
-from starkiller.parsing import ImportedName, ImportFromStatement, ImportModulesStatement, find_imports
+from starkiller.parsing import (
+    ImportedName,
+    ImportFromStatement,
+    ImportModulesStatement,
+    find_imports,
+    find_unused_imports,
+)
 
 TEST_CASE = """
 from os import walk
@@ -51,3 +57,21 @@ def test_find_import(test_case: str, row: int, expected_modules: list[str]) -> N
     found = find_imports(test_case, row)
     assert isinstance(found, ImportModulesStatement)
     assert found.modules == set(expected_modules)
+
+
+UNUSED_TEST_CASE = """
+import os
+import sys as sys_module
+import asyncio.taskgroup
+from time import sleep, time as get_time
+from json import *
+
+print(os.sep, asyncio, get_time())
+"""
+
+
+def test_find_unused_imports() -> None:
+    assert find_unused_imports(UNUSED_TEST_CASE) == {
+        "sys": {ImportedName("sys", "sys_module")},
+        "time": {ImportedName("sleep")},
+    }
@@ -1,4 +1,5 @@
-from starkiller.parsing import ImportedName, parse_module
+from starkiller.parsing import ImportedName, SourceAnalysis, find_imports, parse_module
+from starkiller.stats import collect_stats
 
 TEST_CASE = """
 import asyncio
@@ -90,3 +91,108 @@ def test_find_definitions() -> None:
 def test_find_attrs() -> None:
     results = parse_module(TEST_CASE, check_internal_scopes=True, collect_imported_attrs=True)
     assert results.attr_usages == EXPECTED_ATTRS
+
+
+def test_source_analysis() -> None:
+    analysis = SourceAnalysis(TEST_CASE)
+    assert analysis.names == parse_module(TEST_CASE, check_internal_scopes=True, collect_imported_attrs=True)
+    assert analysis.names is analysis.names
+    assert find_imports(analysis.parso_tree, 4) == find_imports(TEST_CASE, 4)
+    assert "some_function" in analysis.used_names
+
+
+def test_source_analysis_incremental() -> None:
+    key = "test_source_analysis_incremental"
+    analysis = SourceAnalysis(TEST_CASE, diff_cache_key=key)
+    assert analysis.statements
+    names = analysis.names
+
+    # Only comments and whitespace changed
+    source = TEST_CASE.replace("SOME_CONSTANT =", "# Comment\n\nSOME_CONSTANT =")
+    analysis = SourceAnalysis(source, previous=analysis, diff_cache_key=key)
+    assert analysis.parso_tree.get_code() == source
+    assert analysis.names is names
+
+    # Only the changed statement is summarized again
+    source = source.replace("print(internal_scope_var)", "print(internal_scope_var, new_undefined_name)")
+    analysis = SourceAnalysis(source, previous=analysis, diff_cache_key=key)
+    with collect_stats() as stats:
+        assert analysis.names
+    assert stats.counters["statements_summarized"] == 1
+    assert analysis.parso_tree.get_code() == source
+    assert analysis.names == parse_module(source, check_internal_scopes=True, collect_imported_attrs=True)
+    assert "new_undefined_name" in analysis.names.undefined
+
+    # Internal scopes are rescanned with the module context
+    source = source.replace("self.attr1 = init_arg", "self.attr1 = init_arg + SOME_CONSTANT + np.cross(1, 2)")
+    analysis = SourceAnalysis(source, previous=analysis, diff_cache_key=key)
+    assert analysis.parso_tree.get_code() == source
+    assert analysis.names == parse_module(source, check_internal_scopes=True, collect_imported_attrs=True)
+    assert "cross" in analysis.names.attr_usages["np"]
+
+
+def test_all_names() -> None:
+    assert parse_module("x = 1\n").all_names is None
+    assert parse_module("__all__ = ['a', 'b']\n").all_names == {"a", "b"}
+    assert parse_module("__all__ = ('a',)\n__all__.extend(other.__all__)\n").all_names is None
+    assert parse_module("__all__ = [name for name in dir()]\n").all_names is None
+
+    source = "__all__ = ['a'] + ['b']\n__all__ += ('c',)\n__all__.extend(['d'])\n__all__.append('e')\n"
+    assert parse_module(source).all_names == {"a", "b", "c", "d", "e"}
+    assert SourceAnalysis(source).names.all_names == {"a", "b", "c", "d", "e"}
+    assert parse_module("__all__ += ['a']\n").all_names is None
+    assert parse_module("__all__ = ['a']\n__all__.remove('a')\n").all_names is None
+
+
+def test_find_definitions_chunked() -> None:
+    source = "\n".join(f"@decorator\ndef func_{i}():\n    '''\nNot a statement\n'''\n" for i in range(500))
+    source += "\nif True:\n    pass\nelse:\n    last = 1\n"
+    look_for = {"func_0", "func_499", "last", "missing"}
+    assert parse_module(source, find_definitions=look_for).defined == {"func_0", "func_499", "last"}
+
+    # The rest of the module isn't parsed once all names are found
+    assert parse_module(source + "def broken(:\n", find_definitions={"func_1"}).defined == {"func_1"}
+
+    # Clauses following other clauses are not split off, whatever follows the keyword
+    for first, second in [("except ValueError:", "except(KeyError):"), ("except* ValueError:", "except* KeyError:")]:
+        source = "".join(f"try:\n    pass\n{first}\n    pass\n{second}\n    last = {i}\n" for i in range(500))
+        assert parse_module(source, find_definitions={"last", "missing"}).defined == {"last"}
+
+
+def test_internal_scopes() -> None:
+    source = """
+from os import PathLike
+
+def outer(arg):
+    import os
+    __all__.append("hidden")
+    local = os.getcwd()
+
+    class Inner:
+        def method(self):
+            return local, arg, outer_only, os.sep, self.attr
+
+    return Inner
+
+def other():
+    return local, os.name
+"""
+    results = parse_module(source, check_internal_scopes=True)
+    assert results.import_map == {"os": {ImportedName(name="PathLike")}}
+    assert results.defined == {"outer", "other"}
+    assert results.undefined == {"__all__", "outer_only", "local", "os"}
+    assert results.all_names is None
+
+    # Arguments of deeply nested scopes are visible inside them only
+    depth = 50
+    source = "".join(f"{'    ' * level}def f{level}(a{level}):\n" for level in range(depth))
+    source += "    " * depth + "return " + " + ".join(f"a{level}" for level in range(depth)) + " + b\n"
+    source += "def sibling():\n    return a0\n"
+    assert parse_module(source, check_internal_scopes=True).undefined == {"b", "a0"}
+
+
+def test_deeply_nested_expression() -> None:
+    # Long chains of binary operations are nested deeper than the recursion limit allows to visit recursively
+    names = {f"name_{i}" for i in range(1000)}
+    source = "value = " + " + ".join(sorted(names)) + "\n"
+    assert parse_module(source).undefined == names
@@ -0,0 +1,78 @@
+import threading
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("pylsp")
+
+from pylsp import uris
+from pylsp.config.config import Config
+from pylsp.workspace import Workspace
+
+from starkiller.pylsp_plugin import plugin
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def workspace(tmp_path: Path) -> Generator[Workspace]:
+    root_uri = uris.from_fs_path(str(tmp_path))
+    yield Workspace(root_uri, MagicMock(), Config(root_uri, {}, 0, {}))
+    plugin.pylsp_shutdown()
+
+
+def _get_action_edits(workspace: Workspace, path: Path, line_no: int) -> dict[str, list[str]]:
+    document = workspace.get_document(uris.from_fs_path(str(path)))
+    with plugin.use_project(workspace) as project:
+        code_actions = plugin.get_code_actions(project, document, plugin.get_analysis(document), line_no, {})
+    edits: dict[str, list[str]] = {}
+    for action in code_actions:
+        changes = action.get("edit", {}).get("changes", {})
+        edits[action["title"]] = [edit["newText"] for text_edits in changes.values() for edit in text_edits]
+    return edits
+
+
+def test_broken_star_imported_module(workspace: Workspace, tmp_path: Path) -> None:
+    (tmp_path / "broken.py").write_text("def broken(:\n")
+    module = tmp_path / "module.py"
+    module.write_text("from broken import *\nfrom time import *\n\nsleep(undefined)\n")
+
+    # Star imports of a module that can't be parsed are left as is, others are still replaced
+    expected_file_edits = ["from time import sleep"]
+    actions = _get_action_edits(workspace, module, 1)
+    assert actions["Starkiller: Replace * with explicit names in file"] == expected_file_edits
+    assert "Starkiller: Replace * with explicit names" not in actions
+
+    actions = _get_action_edits(workspace, module, 2)
+    assert actions["Starkiller: Replace * with explicit names"] == expected_file_edits
+    assert actions["Starkiller: Replace * with explicit names in file"] == expected_file_edits
+
+
+def test_concurrent_project_creation(workspace: Workspace, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Projects are created without holding the registry lock, so both requests get to create one
+    requests = 2
+    barrier = threading.Barrier(requests, timeout=TIMEOUT)
+    created: list[MagicMock] = []
+
+    def create_project(*args: object, **kwargs: object) -> MagicMock:  # noqa: ARG001
+        barrier.wait()
+        project = MagicMock()
+        created.append(project)
+        return project
+
+    def use_project() -> object:
+        with plugin.use_project(workspace) as project:
+            return project
+
+    monkeypatch.setattr(plugin, "StarkillerProject", create_project)
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        used = [future.result() for future in [pool.submit(use_project) for _ in range(requests)]]
+
+    # The request that lost the race uses the registered project and closes its own one
+    assert len(created) == requests
+    assert used[0] is used[1]
+    assert [project.close.call_count for project in created if project is not used[0]] == [1]
+    assert used[0].close.call_count == 0
@@ -1,6 +1,14 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
 from pytest_virtualenv import VirtualEnv  # type: ignore
 
+from starkiller.models import ImportedName, ModuleNames
+from starkiller.parsing import parse_module
 from starkiller.project import StarkillerProject
+from starkiller.stats import collect_stats
 
 
 def test_asyncio_definitions(virtualenv: VirtualEnv) -> None:
@@ -21,6 +29,208 @@ def test_time_definitions(virtualenv: VirtualEnv) -> None:
     assert names == look_for
 
 
+def test_stdlib_exports(tmp_path: Path) -> None:
+    persistent_cache = tmp_path / "modules.sqlite3"
+    project = StarkillerProject(tmp_path, persistent_cache=persistent_cache)
+
+    # Names out of `__all__` and stubs imports aren't exported
+    assert project.find_definitions("json", {"dumps", "detect_encoding", "codecs"}) == {"dumps"}
+    assert project.find_definitions("time", {"sleep", "sys"}) == {"sleep"}
+    # Extension modules and `os.path` are only found as stubs
+    assert project.find_definitions("math", {"sqrt", "missing"}) == {"sqrt"}
+    assert project.find_definitions("os.path", {"join", "missing"}) == {"join"}
+    # Python 3 stubs are used for built-in modules
+    assert project.find_definitions("itertools", {"accumulate", "zip_longest", "izip"}) == {"accumulate", "zip_longest"}
+
+    # Exports are indexed once and shared through the index file
+    project = StarkillerProject(tmp_path, persistent_cache=persistent_cache)
+    with collect_stats() as stats:
+        assert project.find_definitions("json", {"loads"}) == {"loads"}
+    assert stats.counters["stdlib_index_hits"] == 1
+    assert "modules_parsed" not in stats.counters
+
+
+def test_path_entries_not_stdlib(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    src = tmp_path / "src"
+    src.mkdir()
+    module_path = src / "mylib.py"
+    module_path.write_text("def old():\n    pass\n")
+    monkeypatch.setenv("PYTHONPATH", str(src))
+    persistent_cache = tmp_path / "cache" / "modules.sqlite3"
+    project = StarkillerProject(tmp_path, persistent_cache=persistent_cache)
+
+    # Modules added to the interpreter path are parsed as any other module, not indexed for good
+    with collect_stats() as stats:
+        assert project.find_definitions("mylib", {"old", "new"}) == {"old"}
+    assert "stdlib_modules_indexed" not in stats.counters
+
+    module_path.write_text("def new():\n    pass\n")
+    project.invalidate([module_path])
+    assert project.find_definitions("mylib", {"old", "new"}) == {"new"}
+    project.close()
+
+
+def test_invalidate_stdlib(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    stdlib = tmp_path / "stdlib"
+    (stdlib / "fakelib").mkdir(parents=True)
+    (stdlib / "fakelib" / "__init__.py").write_text("from .core import *\n")
+    core_path = stdlib / "fakelib" / "core.py"
+    core_path.write_text("def old():\n    pass\n")
+    monkeypatch.setenv("PYTHONPATH", str(stdlib))
+    monkeypatch.setattr("starkiller.project.get_stdlib_dirs", lambda _: (stdlib,))
+    project = StarkillerProject(tmp_path / "project")
+
+    with collect_stats() as stats:
+        assert project.find_definitions("fakelib", {"old", "new"}) == {"old"}
+    assert stats.counters["stdlib_modules_indexed"] == 1
+
+    # Exports of the changed module and of the package re-exporting it are indexed again
+    core_path.write_text("def new():\n    pass\n")
+    project.invalidate([core_path])
+    assert project.find_definitions("fakelib", {"old", "new"}) == {"new"}
+
+
+def test_all_names_definitions(tmp_path: Path) -> None:
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "__init__.py").write_text("from .core import *\n\n__all__ = ['alpha']\n__all__ += ['beta']\n")
+    (package / "core.py").write_text("def alpha():\n    pass\n\ndef beta():\n    pass\n\ndef gamma():\n    pass\n")
+    project = StarkillerProject(tmp_path)
+
+    # Imports of a module with `__all__` aren't followed
+    with collect_stats() as stats:
+        assert project.find_definitions("package", {"alpha", "beta", "gamma"}) == {"alpha", "beta"}
+    assert stats.counters["modules_parsed"] == 1
+
+
+def test_parallel_definitions(tmp_path: Path) -> None:
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "__init__.py").write_text("".join(f"from .mod{i} import *\n" for i in range(4)))
+    for i in range(4):
+        (package / f"mod{i}.py").write_text(f"from .mod{i + 1} import *\n\ndef func{i}():\n    pass\n")
+    look_for = {"func0", "func3", "missing"}
+
+    project = StarkillerProject(tmp_path, workers=2)
+    try:
+        with collect_stats() as stats:
+            assert project.find_definitions("package", set(look_for)) == {"func0", "func3"}
+    finally:
+        project.close()
+
+    # Every module is parsed once, even if several modules star import it
+    assert stats.counters["modules_parsed"] == len(list(package.glob("*.py")))
+    assert StarkillerProject(tmp_path).find_definitions("package", set(look_for)) == {"func0", "func3"}
+
+
+def test_warm_up(tmp_path: Path) -> None:
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "__init__.py").write_text("from .mod import *\nfrom time import *\n")
+    (package / "mod.py").write_text("from json import *\n\ndef func():\n    pass\n")
+    (tmp_path / "main.py").write_text("from package import *\nfrom json import *\n\nsleep(dumps(1))\n")
+
+    project = StarkillerProject(tmp_path)
+    assert project.count_star_imports([tmp_path]) == {"package": 1, "package.mod": 1, "json": 2, "time": 1}
+
+    with collect_stats() as stats:
+        project.warm_up("package")
+        project.warm_up("json")
+    assert stats.counters["stdlib_modules_indexed"] == len({"time", "json"})
+    assert stats.counters["stdlib_index_hits"] == 1
+
+    # Everything needed is cached now
+    with collect_stats() as stats:
+        assert project.find_definitions("package", {"func", "dumps", "sleep"}) == {"func", "dumps", "sleep"}
+    assert "modules_parsed" not in stats.counters
+
+
+def test_concurrent_queries(tmp_path: Path) -> None:
+    package = tmp_path / "package"
+    package.mkdir()
+    sources = [
+        f"from .mod{i + 1} import *\nfrom json import *\n\ndef func{i}(arg):\n    return arg\n" for i in range(7)
+    ]
+    (package / "__init__.py").write_text("".join(f"from .mod{i} import *\n" for i in range(len(sources))))
+    for i, source in enumerate(sources):
+        (package / f"mod{i}.py").write_text(source)
+    look_for = {"func0", "func6", "dumps", "missing"}
+    expected_names = [parse_module(source, check_internal_scopes=True) for source in sources]
+
+    def query(i: int) -> tuple[set[str], ModuleNames]:
+        module_no = i % len(sources)
+        if module_no == 0:
+            project.invalidate([package / f"mod{i % 3}.py"])
+        elif module_no == 1:
+            assert project.get_import_graph().get_star_importers(f"package.mod{i % 3}")
+        names = parse_module(sources[module_no], check_internal_scopes=True)
+        return project.find_definitions("package", set(look_for)), names
+
+    # Switch threads as often as possible to make races likely
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    project = StarkillerProject(tmp_path, workers=2)
+    try:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(query, range(210)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+        project.close()
+
+    for i, (found, names) in enumerate(results):
+        assert found == {"func0", "func6", "dumps"}
+        assert names == expected_names[i % len(sources)]
+
+
+def test_star_import_cycles(tmp_path: Path) -> None:
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "__init__.py").write_text("from .first import *\nfrom .second import *\n")
+    (package / "first.py").write_text("from package.second import *\n\nFIRST = 1\n")
+    (package / "second.py").write_text("from package.first import *\n\nSECOND = 2\n")
+    project = StarkillerProject(tmp_path)
+
+    report = project.explain_definitions("package", {"FIRST", "SECOND", "missing"})
+    assert report.found == {"FIRST", "SECOND"}
+    assert report.modules == ["package", "package.first", "package.second"]
+    assert report.cycles == [("package.first", "package.second", "package.first")]
+    assert ("package", "package.second") in report.star_imports
+
+
+def test_star_import_lattice(tmp_path: Path) -> None:
+    # Every module of a layer star imports both modules of the next one, that's 2 ** depth import paths
+    depth = 16
+    for layer in range(depth):
+        for side in "ab":
+            next_imports = "".join(f"from m{layer + 1}{s} import *\n" for s in "ab") if layer < depth - 1 else ""
+            (tmp_path / f"m{layer}{side}.py").write_text(f"{next_imports}\nNAME_{layer}{side} = 1\n")
+    project = StarkillerProject(tmp_path)
+
+    report = project.explain_definitions("m0a", {f"NAME_{depth - 1}b", "missing"})
+    assert report.found == {f"NAME_{depth - 1}b"}
+    assert len(report.modules) == len(set(report.modules)) == 2 * depth - 1
+
+
+def test_relative_star_imports(tmp_path: Path) -> None:
+    package = tmp_path / "pkg"
+    (package / "sub").mkdir(parents=True)
+    (package / "__init__.py").write_text("from .a import *\nfrom .sub.c import *\n")
+    (package / "a.py").write_text("from .b import *\n")
+    (package / "b.py").write_text("def f():\n    pass\n")
+    (package / "sub" / "__init__.py").touch()
+    (package / "sub" / "c.py").write_text("from ..d import *\nfrom ...beyond import *\n")
+    (package / "d.py").write_text("def g():\n    pass\n")
+    look_for = {"f", "g", "missing"}
+
+    # Relative imports of modules are resolved against their package, as with workers
+    assert StarkillerProject(tmp_path).find_definitions("pkg", set(look_for)) == {"f", "g"}
+    project = StarkillerProject(tmp_path, workers=2)
+    try:
+        assert project.find_definitions("pkg", set(look_for)) == {"f", "g"}
+    finally:
+        project.close()
+
+
 def test_fastapi_definitions(virtualenv: VirtualEnv) -> None:
     virtualenv.install_package("fastapi==0.115.12")
     project = StarkillerProject(virtualenv.workspace, env_path=virtualenv.virtualenv)
@@ -58,3 +268,26 @@ def test_jedi_definitions(virtualenv: VirtualEnv) -> None:
     find_in_jedi_api_project = {"Project", "get_default_project"}
     names = project.find_definitions("jedi.api", find_in_jedi_api_project)
     assert names == find_in_jedi_api_project
+
+
+def test_iter_import_issues(tmp_path: Path) -> None:
+    (tmp_path / "first.py").write_text("from time import *\nimport os\n\nsleep(1)\n")
+    (tmp_path / "second.py").write_text("from json import *\n")
+    (tmp_path / "third.py").write_text("from time import *\nfrom time import *\n\nsleep(1)\n")
+    (tmp_path / "broken.py").write_text("def broken(:\n")
+
+    project = StarkillerProject(tmp_path)
+    issues = {issue.path.name: issue for issue in project.iter_import_issues([tmp_path])}
+
+    def star_imports(name: str) -> list[tuple[str, int, set[str]]]:
+        return [
+            (statement.module, statement.import_range.start.line, names)
+            for statement, names in issues[name].star_imports
+        ]
+
+    assert star_imports("first.py") == [("time", 1, {"sleep"})]
+    assert issues["first.py"].unused_imports == {"os": {ImportedName("os")}}
+    assert star_imports("second.py") == [("json", 1, set())]
+    # Repeated star imports are reported separately, names are attributed to the last one
+    assert star_imports("third.py") == [("time", 1, set()), ("time", 2, {"sleep"})]
+    assert issues["broken.py"].error is not None
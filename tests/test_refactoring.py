@@ -1,6 +1,9 @@
+from pathlib import Path
+
 from parso import split_lines
 
-from starkiller.refactoring import EditRange, rename, strip_base_name
+from starkiller.project import StarkillerProject
+from starkiller.refactoring import EditRange, apply_edits, rename, replace_star_imports, strip_base_name
 
 RENAME_TEST_CASE = """
 from numpy import ndarray, dot
@@ -54,3 +57,52 @@ def test_rename() -> None:
 def test_attrs_as_names() -> None:
     changes = list(strip_base_name(ATTRS_TEST_CASE, "np", {"ndarray", "dot"}))
     assert apply_inline_changes(ATTRS_TEST_CASE, changes) == ATTRS_EXPECTED_RESULT
+
+
+STAR_IMPORTS_TEST_CASE = """
+from os.path import *
+from .utils import *
+from asyncio import *
+from time import *
+
+print(sleep(1), run, helper())
+"""
+
+STAR_IMPORTS_EXPECTED_RESULT = """
+from .utils import helper
+from asyncio import run
+from time import sleep
+
+print(sleep(1), run, helper())
+"""
+
+
+def test_apply_edits() -> None:
+    changes = list(rename(RENAME_TEST_CASE, {"ndarray": "np.ndarray", "dot": "np.dot"}))
+    assert apply_edits(RENAME_TEST_CASE, changes) == RENAME_EXPECTED_RESULT
+
+
+def test_replace_star_imports(tmp_path: Path) -> None:
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "__init__.py").touch()
+    (package / "utils.py").write_text("def helper():\n    pass\n\ndef sleep():\n    pass\n")
+    module_path = package / "module.py"
+
+    project = StarkillerProject(tmp_path)
+    changes = list(replace_star_imports(STAR_IMPORTS_TEST_CASE, project, module_path))
+    assert apply_edits(STAR_IMPORTS_TEST_CASE, changes) == STAR_IMPORTS_EXPECTED_RESULT
+
+
+def test_replace_unresolved_star_imports(tmp_path: Path) -> None:
+    # Names provided by extension modules without stubs and packages that aren't installed are unknown
+    (tmp_path / "fast_ext.cpython-313-x86_64-linux-gnu.so").touch()
+    source = "from fast_ext import *\nfrom not_installed_pkg import *\nfrom json import *\n\nprint(ext, loads)\n"
+    project = StarkillerProject(tmp_path)
+    report = project.explain_definitions("fast_ext", {"ext"})
+    assert report.unresolved == ["fast_ext"]
+    assert not report.found
+
+    changes = list(replace_star_imports(source, project))
+    expected = "from fast_ext import *\nfrom not_installed_pkg import *\nfrom json import loads\n\nprint(ext, loads)\n"
+    assert apply_edits(source, changes) == expected
@@ -0,0 +1,44 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from starkiller.cache import ModuleNamesCache
+from starkiller.stats import collect_stats, count, timer
+
+
+def test_collect_stats(tmp_path: Path) -> None:
+    # Nothing is recorded outside of a collection block
+    count("ignored")
+    with timer("ignored"):
+        pass
+
+    module = tmp_path / "module.py"
+    module.write_text("def func():\n    pass\n")
+    cache = ModuleNamesCache()
+
+    with collect_stats() as stats:
+        with timer("stage"):
+            count("events", 2)
+        cache.parse(module)
+        cache.parse(module)
+
+    assert set(stats.timers) == {"stage", "parse_module"}
+    assert stats.counters == {"events": 2, "modules_parsed": 1, "cache_hits": 1}
+    assert "events=2" in stats.format()
+
+    with collect_stats() as stats:
+        pass
+    assert stats.format() == "nothing recorded"
+
+
+def test_collect_stats_in_threads() -> None:
+    # Worker threads running in copies of the request context share its statistics
+    def work() -> None:
+        for _ in range(10_000):
+            count("events")
+
+    with collect_stats() as stats, ThreadPoolExecutor(max_workers=4) as pool:
+        context = contextvars.copy_context()
+        for future in [pool.submit(context.copy().run, work) for _ in range(8)]:
+            future.result()
+    assert stats.counters == {"events": 80_000}
@@ -0,0 +1,34 @@
+import json
+from pathlib import Path
+
+from starkiller.stdlib_index import StdlibExportsIndex, get_index_file_name
+
+
+def test_stdlib_exports_index(tmp_path: Path) -> None:
+    stdlib_dirs = [Path("/usr/lib/python3.12"), Path("/usr/lib/python3.12/lib-dynload")]
+    index_path = tmp_path / get_index_file_name((3, 12, 1), "0.19.2", stdlib_dirs)
+    assert index_path.name.startswith("stdlib-exports-py3.12-jedi0.19.2-")
+
+    # Every installation has its own index, whatever the patch version
+    assert get_index_file_name((3, 12, 4), "0.19.2", stdlib_dirs[::-1]) == index_path.name
+    assert get_index_file_name((3, 12, 1), "0.19.2", [Path("/opt/python3.12/lib")]) != index_path.name
+
+    index = StdlibExportsIndex(index_path)
+    assert index.get("json") is None
+    index.add("json", frozenset({"dump", "dumps"}))
+    assert index.get("json") == {"dump", "dumps"}
+
+    # Index is shared through the file
+    assert StdlibExportsIndex(index_path).get("json") == {"dump", "dumps"}
+
+    index.discard(["json", "missing"])
+    assert index.get("json") is None
+    assert StdlibExportsIndex(index_path).get("json") is None
+    index.add("json", frozenset({"dump", "dumps"}))
+
+    # Files of other format versions are ignored
+    index_path.write_text(json.dumps({"version": 0, "modules": {"json": ["dump"]}}))
+    assert StdlibExportsIndex(index_path).get("json") is None
+
+    # In-memory index
+    assert StdlibExportsIndex().get("json") is None
@@ -0,0 +1,34 @@
+import subprocess  # noqa: S404
+import sys
+
+from starkiller.utils import get_builtin_names, get_stub_stdlib_subdirs
+
+# Generous limit to catch eager imports of heavy dependencies, not to measure exact startup time
+IMPORT_TIME_BUDGET = 0.5
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import starkiller.cli, starkiller.parsing, starkiller.project, starkiller.refactoring
+print(time.perf_counter() - start)
+print("jedi" in sys.modules)
+"""
+
+
+def test_lazy_import() -> None:
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], capture_output=True, text=True, check=True)  # noqa: S603
+    import_time, jedi_imported = result.stdout.split()
+    assert jedi_imported == "False"
+    assert float(import_time) < IMPORT_TIME_BUDGET
+
+
+def test_builtins() -> None:
+    assert "print" in get_builtin_names()
+    assert any((path / "sys.pyi").is_file() for path in get_stub_stdlib_subdirs())
+
+
+def test_stub_stdlib_subdirs() -> None:
+    # Python 2 stubs are skipped, newer stubs come first
+    names = [path.name for path in get_stub_stdlib_subdirs()]
+    assert "2" not in names
+    assert names.index("3") < names.index("2and3")